@@ -0,0 +1,158 @@
+from datetime import date, datetime, time
+from sqlalchemy import event, select, insert, delete, and_, or_, exists, inspect, tuple_
+from sqlalchemy.orm import Session, joinedload
+from models import db, Activity, Author, Book, List, Post, TimelineEntry, User, UserBook
+
+# activities is an append-only log of what users do: a row is written in the same
+# flush that marks a book as read, creates a list or adds a post. Profile feeds
+# read it with one query on (user_id, occurred_at, id) instead of merging
+# user_books, lists and posts in Python.
+#
+# Entries are never updated. Marking a book unread deletes its book_read entry
+# and the timeline copies, so reading it again logs a single new one. The feed
+# skips entries whose list or post has been deleted (or whose read was removed
+# behind the ORM's back), and shows lists that are not public only to their owner.
+
+BACKFILL_BATCH_SIZE = 1000
+FEED_ORDER = (Activity.occurred_at.desc(), Activity.id.desc())
+
+# Called with the connection and the (id, user_id, occurred_at) rows of every
+# batch of new activities, in the flush that logged them (see timeline.py)
+_activity_hooks = []
+
+
+def on_new_activities(hook):
+    _activity_hooks.append(hook)
+    return hook
+
+
+def _committed_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _activity(user_id, type, occurred_at, book_id=None, list_id=None, post_id=None):
+    # Every row carries all columns so a batch can be inserted with one executemany
+    return {'user_id': user_id, 'type': type, 'occurred_at': occurred_at,
+            'book_id': book_id, 'list_id': list_id, 'post_id': post_id}
+
+
+def read_timestamp(read_date):
+    """When a read happened: now for books read today, the start of the day for earlier dates."""
+    if read_date is None or read_date >= date.today():
+        return datetime.utcnow()
+    return datetime.combine(read_date, time.min)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_activities(session, flush_context):
+    rows = []
+    # (user_id, book_id) of reads removed in this flush
+    unread = []
+    for obj in session.new:
+        if isinstance(obj, UserBook) and obj.read_date is not None:
+            rows.append(_activity(obj.user_id, 'book_read', read_timestamp(obj.read_date), book_id=obj.book_id))
+        elif isinstance(obj, List):
+            rows.append(_activity(obj.user_id, 'list_created', datetime.utcnow(), list_id=obj.id))
+        elif isinstance(obj, Post) and obj.user_id is not None:
+            rows.append(_activity(obj.user_id, 'post_created', datetime.utcnow(), post_id=obj.id))
+
+    for obj in session.deleted:
+        if isinstance(obj, UserBook) and _committed_value(obj, 'read_date') is not None:
+            unread.append((obj.user_id, obj.book_id))
+
+    for obj in session.dirty:
+        if isinstance(obj, UserBook) and obj not in session.deleted:
+            was_read = _committed_value(obj, 'read_date') is not None
+            if not was_read and obj.read_date is not None:
+                rows.append(_activity(obj.user_id, 'book_read', read_timestamp(obj.read_date), book_id=obj.book_id))
+            elif was_read and obj.read_date is None:
+                unread.append((obj.user_id, obj.book_id))
+
+    if unread:
+        _remove_read_activities(session.connection(), unread)
+    if rows:
+        record_activities(session.connection(), rows)
+
+
+def _remove_read_activities(connection, reads):
+    read_activities = select(Activity.id).where(Activity.type == 'book_read',
+                                                tuple_(Activity.user_id, Activity.book_id).in_(reads))
+    connection.execute(delete(TimelineEntry).where(TimelineEntry.activity_id.in_(read_activities)))
+    connection.execute(delete(Activity).where(Activity.id.in_(read_activities)))
+
+
+def record_activities(connection, rows):
+    activities = connection.execute(
+        insert(Activity).returning(Activity.id, Activity.user_id, Activity.occurred_at), rows).all()
+    for hook in _activity_hooks:
+        hook(connection, activities)
+
+
+def _visible(viewer_id):
+    still_read = exists().where(UserBook.user_id == Activity.user_id,
+                                UserBook.book_id == Activity.book_id,
+                                UserBook.read_date.isnot(None))
+    return and_(
+        or_(Activity.book_id.is_(None), still_read),
+        or_(Activity.list_id.is_(None),
+            Activity.list.has(or_(List.is_public == True, List.user_id == viewer_id))),
+        or_(Activity.post_id.is_(None), Activity.post.has()),
+    )
+
+
+def activity_query(viewer_id):
+    """Activities ``viewer_id`` may see, with what the feed templates show already loaded."""
+    return Activity.query.filter(_visible(viewer_id)).options(
+        joinedload(Activity.book).joinedload(Book.title),
+        joinedload(Activity.book).joinedload(Book.author).joinedload(Author.name),
+        joinedload(Activity.list).joinedload(List.name),
+        joinedload(Activity.post),
+    )
+
+
+def user_activity_query(user_id, viewer_id):
+    return activity_query(viewer_id).filter(Activity.user_id == user_id)
+
+
+def _insert_batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            db.session.execute(insert(Activity), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Activity), batch)
+
+
+def backfill_activities():
+    """Log reads, lists and posts that have no activity yet, e.g. rows from before the log existed."""
+    logged_reads = select(Activity.id).where(Activity.type == 'book_read',
+                                             Activity.user_id == UserBook.user_id,
+                                             Activity.book_id == UserBook.book_id)
+    reads = db.session.query(UserBook.user_id, UserBook.book_id, UserBook.read_date)\
+        .filter(UserBook.read_date.isnot(None), ~logged_reads.exists())\
+        .yield_per(BACKFILL_BATCH_SIZE)
+    _insert_batches(_activity(user_id, 'book_read', datetime.combine(read_date, time.min), book_id=book_id)
+                    for user_id, book_id, read_date in reads)
+
+    # Lists have no creation time, the owner's join date is the closest known bound
+    lists = db.session.query(List.id, List.user_id, User.date_joined)\
+        .join(User, User.id == List.user_id)\
+        .filter(~select(Activity.id).where(Activity.list_id == List.id).exists())\
+        .yield_per(BACKFILL_BATCH_SIZE)
+    _insert_batches(_activity(user_id, 'list_created', date_joined or datetime.utcnow(), list_id=list_id)
+                    for list_id, user_id, date_joined in lists)
+
+    posts = db.session.query(Post.id, Post.user_id, Post.timestamp)\
+        .filter(Post.user_id.isnot(None),
+                ~select(Activity.id).where(Activity.post_id == Post.id).exists())\
+        .yield_per(BACKFILL_BATCH_SIZE)
+    _insert_batches(_activity(user_id, 'post_created', timestamp or datetime.utcnow(), post_id=post_id)
+                    for post_id, user_id, timestamp in posts)
+    db.session.commit()
@@ -1,4 +1,5 @@
-from flask import Flask, g, request, session
+import os
+from flask import Flask, g
 from flask_login import LoginManager, login_user, current_user
 from models import Book, UserBook, db, User, ReadingGoal, Author, List, BookList
 from flask_migrate import Migrate
@@ -7,13 +8,21 @@ from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
 from sqlalchemy.orm import RelationshipProperty
 from flask_babel import Babel, lazy_gettext as _l
+from config import Config
+from image_store import profile_image_url
+from request_context import resolve_locale, current_language, add_counter_headers
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['IMPORT_FOLDER'] = os.path.join(app.instance_path, 'imports')
+app.config['IMAGE_STORE_FOLDER'] = os.path.join(app.instance_path, 'images')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max-limit
+# Show "Page x of y+" for searches instead of counting every match
+app.config['SEARCH_ESTIMATED_TOTALS'] = False
+# Send the per-request locale counters as X-Locale-* response headers
+app.config['REQUEST_COUNTERS_HEADER'] = False
 
 # Flask-Babel configuration
 app.config['LANGUAGES'] = ['en', 'de', 'es', 'fr']
@@ -24,24 +33,11 @@ db.init_app(app)
 migrate = Migrate(app, db)
 
 
-def get_locale():
-    # 1. Check if user is logged in and has a preferred language
-    if current_user.is_authenticated and hasattr(current_user,
-                                                 'preferred_language'):
-        return current_user.preferred_language
-
-    # 2. Check for language in session
-    if 'language' in session:
-        return session['language']
-
-    # 3. Try to guess the language from the user accept header the browser transmits
-    return request.accept_languages.best_match(app.config['LANGUAGES'])
-
-
-babel = Babel(app, locale_selector=get_locale)
+babel = Babel(app, locale_selector=resolve_locale)
 
 # Add get_locale to Jinja2 environment
-app.jinja_env.globals['get_locale'] = get_locale
+app.jinja_env.globals['get_locale'] = current_language
+app.jinja_env.globals['profile_image_url'] = profile_image_url
 
 class CustomModelView(ModelView):
     column_display_pk = True
@@ -100,17 +96,27 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
+
+
+# Id of the 'test' user logged in for anonymous requests, looked up once per process
+_test_user_id = None
 
 
 @app.before_request
 def before_request():
+    global _test_user_id
     if not current_user.is_authenticated:
-        user = User.query.filter_by(username='test').first()
+        if _test_user_id is None:
+            _test_user_id = db.session.query(User.id).filter_by(username='test').scalar()
+        user = db.session.get(User, _test_user_id) if _test_user_id is not None else None
         if user:
             login_user(user)
     g.user = current_user
 
 
+app.after_request(add_counter_headers)
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
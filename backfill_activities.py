@@ -0,0 +1,14 @@
+from app import app
+from models import Activity
+from activity_log import backfill_activities
+from timeline import backfill_timelines
+
+# Logs reads, lists and posts that predate the activities table. Rows that
+# already have an activity are skipped, so it can be re-run at any time. The
+# inboxes of existing follows are then filled with their recent activities.
+with app.app_context():
+    before = Activity.query.count()
+    backfill_activities()
+    print(f"Backfilled {Activity.query.count() - before} activities")
+    backfill_timelines()
+    print("Filled the timelines of existing follows")
@@ -0,0 +1,79 @@
+import random
+import sys
+import time
+import warnings
+from fuzzywuzzy import fuzz
+from fuzzy_index import NgramIndex, FUZZY_MATCH_THRESHOLD
+
+warnings.filterwarnings('ignore')
+
+# Compares the n-gram candidate index used by the CSV import with the previous
+# approach of scoring every author in the catalog. Runs on a synthetic catalog,
+# no database needed: python benchmark_fuzzy_index.py [authors] [rows]
+
+SYLLABLES = ['an', 'ber', 'chri', 'dor', 'el', 'fon', 'gar', 'hel', 'is', 'jo', 'kar', 'lin',
+             'mar', 'nor', 'ol', 'per', 'qui', 'ros', 'sta', 'tol', 'ul', 'ver', 'wil', 'xa', 'yo', 'zen']
+
+
+def random_name(rng):
+    first = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    last = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f"{first} {last}"
+
+
+def misspell(rng, name):
+    # Goodreads exports often drop first names or contain small typos
+    if rng.random() < 0.5:
+        name = name.split(' ')[-1]
+    chars = list(name)
+    position = rng.randrange(len(chars))
+    chars[position] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+    return ''.join(chars)
+
+
+def naive_match(catalog, query):
+    best_key = None
+    highest_ratio = 0
+    for key, (name_en, name_de) in catalog.items():
+        ratio = max(fuzz.partial_ratio(name_en, query), fuzz.partial_ratio(name_de, query))
+        if ratio > highest_ratio:
+            highest_ratio = ratio
+            best_key = key
+    return (best_key, highest_ratio) if highest_ratio >= FUZZY_MATCH_THRESHOLD else (None, highest_ratio)
+
+
+def run_benchmark(author_count=2000, row_count=50, seed=42):
+    rng = random.Random(seed)
+    catalog = {}
+    for author_id in range(1, author_count + 1):
+        name = random_name(rng)
+        catalog[author_id] = (name, name)
+    queries = [misspell(rng, catalog[rng.randint(1, author_count)][0]) for _ in range(row_count)]
+
+    start = time.perf_counter()
+    index = NgramIndex((key, list(names)) for key, names in catalog.items())
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [index.best_match(query) for query in queries]
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive = [naive_match(catalog, query) for query in queries]
+    naive_time = time.perf_counter() - start
+
+    # Ties in ratio can pick different authors, so compare the matched score too
+    agreeing = sum(1 for (i_key, i_ratio), (n_key, n_ratio) in zip(indexed, naive)
+                   if i_key == n_key or (i_key is not None and i_ratio == n_ratio))
+
+    print(f"Catalog: {author_count} authors, {row_count} CSV rows")
+    print(f"  index build:   {build_time * 1000:.1f}ms")
+    print(f"  n-gram index:  {indexed_time * 1000:.1f}ms ({indexed_time / row_count * 1000:.2f}ms per row)")
+    print(f"  full scan:     {naive_time * 1000:.1f}ms ({naive_time / row_count * 1000:.2f}ms per row)")
+    print(f"  speedup:       {naive_time / max(indexed_time, 1e-9):.0f}x")
+    print(f"  same result:   {agreeing}/{row_count}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    run_benchmark(*args)
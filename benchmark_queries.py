@@ -0,0 +1,140 @@
+import threading
+import time
+import warnings
+from sqlalchemy import event, update
+from app import app, db
+from models import User, Book, UserBook
+
+warnings.filterwarnings('ignore')
+
+# Each scenario is rendered at several page sizes; a well-behaved route issues
+# the same number of queries no matter how many rows end up on the page.
+SCENARIOS = [
+    ('authors by name', '/author/authors?sort=name&per_page={per_page}'),
+    ('authors by books_count', '/author/authors?sort=books_count&per_page={per_page}'),
+    ('authors by read_percentage', '/author/authors?sort=read_percentage&per_page={per_page}'),
+]
+
+PAGE_SIZES = [6, 12, 24, 48]
+
+# Read-status toggles from several clients while a background writer holds write
+# transactions the way an import batch does; none of the toggles may fail.
+CONTENTION_CLIENTS = 4
+CONTENTION_TOGGLES = 20
+IMPORT_BATCH_HOLD = 0.05
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+def run_scenario(client, counter, url):
+    counter.reset()
+    start = time.perf_counter()
+    response = client.get(url)
+    elapsed = (time.perf_counter() - start) * 1000
+    locale_resolutions = response.headers.get('X-Locale-Resolutions', '-')
+    return response.status_code, counter.count, locale_resolutions, elapsed
+
+
+def run_benchmarks():
+    app.config['REQUEST_COUNTERS_HEADER'] = True
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        if not User.query.first():
+            print("No users in the database, nothing to benchmark.")
+            return
+
+    client = app.test_client()
+    # Warm up the session and the test user login
+    client.get('/')
+
+    results = []
+    for name, url_template in SCENARIOS:
+        query_counts = set()
+        print(f"\n{name}")
+        for per_page in PAGE_SIZES:
+            url = url_template.format(per_page=per_page)
+            status, queries, locale_resolutions, elapsed = run_scenario(client, counter, url)
+            query_counts.add(queries)
+            print(f"  per_page={per_page:<4} status={status} queries={queries:<4} "
+                  f"locale_resolutions={locale_resolutions:<2} time={elapsed:.1f}ms")
+        constant = len(query_counts) == 1
+        results.append((name, constant))
+        print(f"  constant query count: {'yes' if constant else 'NO'}")
+
+    failed = [name for name, constant in results if not constant]
+    print()
+    if failed:
+        print(f"Query count grows with page size for: {', '.join(failed)}")
+    else:
+        print("All scenarios use a constant number of queries.")
+
+    contention_ok = run_write_contention()
+    return not failed and contention_ok
+
+
+def _import_batches(book_ids, stop):
+    with app.app_context():
+        while not stop.is_set():
+            for book_id in book_ids:
+                db.session.execute(update(Book).where(Book.id == book_id).values(page_count=Book.page_count))
+            time.sleep(IMPORT_BATCH_HOLD)
+            db.session.commit()
+            # Matching the next batch happens outside the transaction
+            time.sleep(IMPORT_BATCH_HOLD)
+
+
+def _toggle_reads(book_id, timings, failures):
+    client = app.test_client()
+    for toggle in range(CONTENTION_TOGGLES):
+        start = time.perf_counter()
+        # Starts on an unread book and ends unread after an even number of toggles
+        response = client.post('/book/toggle_read_status', json={'book_id': book_id, 'is_read': toggle % 2 == 0})
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            failures.append(response.status_code)
+
+
+def run_write_contention():
+    with app.app_context():
+        user = User.query.filter_by(username='test').first()
+        read_ids = db.session.query(UserBook.book_id).filter(UserBook.user_id == user.id) if user else []
+        book_ids = [book_id for book_id, in db.session.query(Book.id)
+                    .filter(Book.id.notin_(read_ids)).order_by(Book.id).limit(CONTENTION_CLIENTS + 10)]
+    if not user or len(book_ids) < CONTENTION_CLIENTS + 1:
+        print("\nNot enough unread books for the write contention benchmark.")
+        return True
+
+    print(f"\nwrite contention ({CONTENTION_CLIENTS} clients, {CONTENTION_TOGGLES} toggles each)")
+    stop = threading.Event()
+    writer = threading.Thread(target=_import_batches, args=(book_ids[CONTENTION_CLIENTS:], stop))
+    timings = []
+    failures = []
+    clients = [threading.Thread(target=_toggle_reads, args=(book_id, timings, failures))
+               for book_id in book_ids[:CONTENTION_CLIENTS]]
+    writer.start()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    stop.set()
+    writer.join()
+
+    timings.sort()
+    print(f"  toggles={len(timings)} failed={len(failures)} "
+          f"p50={timings[len(timings) // 2]:.1f}ms p95={timings[int(len(timings) * 0.95)]:.1f}ms")
+    return not failures
+
+
+if __name__ == '__main__':
+    run_benchmarks()
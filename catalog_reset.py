@@ -0,0 +1,30 @@
+from sqlalchemy import select, or_
+from models import (db, Activity, Author, Book, BookList, EnrichmentJob, List, TimelineEntry, Translation,
+                    UserAuthorProgress, UserBook, UserListProgress, user_book)
+from reading_goals import rebuild_goal_progress
+
+# The scraping imports start from an empty catalog. Bulk deletes bypass the
+# flush listeners, so the tables derived from books, authors and lists are
+# cleared with them: otherwise their rows would survive and, as SQLite reuses
+# the freed ids, attach to the newly imported rows.
+
+
+def clear_catalog():
+    """Delete all books, authors, lists and translations with everything derived from them."""
+    catalog_activities = select(Activity.id).where(or_(Activity.book_id.isnot(None), Activity.list_id.isnot(None)))
+    TimelineEntry.query.filter(TimelineEntry.activity_id.in_(catalog_activities)).delete(synchronize_session=False)
+    Activity.query.filter(or_(Activity.book_id.isnot(None), Activity.list_id.isnot(None)))\
+        .delete(synchronize_session=False)
+    UserListProgress.query.delete()
+    UserAuthorProgress.query.delete()
+    EnrichmentJob.query.delete()
+
+    UserBook.query.delete()
+    db.session.execute(user_book.delete())
+    BookList.query.delete()
+    Book.query.delete()
+    Author.query.delete()
+    List.query.delete()
+    Translation.query.delete()
+    # Commits; every goal now counts zero reads
+    rebuild_goal_progress()
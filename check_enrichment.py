@@ -0,0 +1,174 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+warnings.filterwarnings('ignore')
+
+# End-to-end check of the enrichment queue against a local stub of the Google
+# Books and Wikipedia APIs, on a scratch SQLite database: rendering book and
+# author data must not call the APIs and must queue each target once, and the
+# worker must then fill in the missing fields from the stub responses.
+#
+# StubAPIServer can also be started on its own (python check_enrichment.py
+# --serve) to run import_worker.py with GOOGLE_BOOKS_API_URL/WIKIPEDIA_API_URL
+# pointing at it.
+
+STUB_VOLUME = {
+    'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': '9780000000002'}],
+    'description': 'A stubbed description.',
+    'imageLinks': {'thumbnail': 'http://covers.invalid/stub.jpg'},
+    'pageCount': 321,
+    'publishedDate': '1999',
+    'title': 'Stubtitel',
+}
+STUB_THUMBNAIL = 'http://images.invalid/author.jpg'
+# Volume searches for titles containing this answer 503, like a rate-limited API
+STUB_UNAVAILABLE = 'Unavailable'
+
+
+class StubAPIServer(ThreadingHTTPServer):
+    """Answers Google Books volume searches and Wikipedia pageimages queries, recording every request."""
+
+    def __init__(self, port=0):
+        self.requests = []
+        super().__init__(('127.0.0.1', port), _StubHandler)
+
+    @property
+    def google_books_url(self):
+        return f'http://127.0.0.1:{self.server_port}/books/v1/volumes'
+
+    @property
+    def wikipedia_url(self):
+        return f'http://127.0.0.1:{self.server_port}/w/api.php'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self.server.requests.append((url.path, params))
+        if url.path == '/books/v1/volumes' and STUB_UNAVAILABLE in params.get('q', [''])[0]:
+            self.send_error(503)
+            return
+        if url.path == '/books/v1/volumes':
+            body = {'totalItems': 1, 'items': [{'volumeInfo': STUB_VOLUME}]}
+        elif url.path == '/w/api.php':
+            title = params.get('titles', [''])[0]
+            body = {'query': {'pages': {'1': {'title': title, 'thumbnail': {'source': STUB_THUMBNAIL}}}}}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_check():
+    server = StubAPIServer().start()
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    database.close()
+    # Config reads these when app is first imported
+    os.environ['DATABASE_URL'] = f'sqlite:///{database.name}'
+    os.environ['GOOGLE_BOOKS_API_URL'] = server.google_books_url
+    os.environ['WIKIPEDIA_API_URL'] = server.wikipedia_url
+
+    from app import app
+    from models import db, User, Author, Book, Translation, EnrichmentJob
+    from utils import map_book_data, map_author_data
+    from enrichment_jobs import process_pending_enrichments
+
+    problems = []
+    try:
+        with app.app_context():
+            db.create_all()
+            user = User(username='enrichment-check', email='enrichment-check@example.invalid')
+            author = Author(name=Translation(text_en='Stub Author', text_de='Stub Author'),
+                            bio=Translation(text_en='', text_de=''))
+            books = [Book(title=Translation(text_en=f'Stub Book {n}', text_de=f'Stub Book {n}'),
+                          description=Translation(text_en='', text_de=''), author=author)
+                     for n in range(2)]
+            db.session.add_all([user, author, *books])
+            db.session.commit()
+
+            with app.test_request_context():
+                map_book_data(books[0], user.id)
+                map_book_data(books[0], user.id)
+                map_author_data(author, user.id)
+            if server.requests:
+                problems.append(f"rendering made {len(server.requests)} API requests")
+            queued = db.session.query(EnrichmentJob.kind, EnrichmentJob.target_id).order_by(EnrichmentJob.id).all()
+            expected = [('book', books[0].id), ('book', books[1].id), ('author', author.id)]
+            if sorted(queued) != sorted(expected):
+                problems.append(f"queued {queued}, expected {expected}")
+
+            processed = process_pending_enrichments()
+            db.session.expire_all()
+            if processed != len(expected):
+                problems.append(f"worker processed {processed} jobs, expected {len(expected)}")
+            failed = EnrichmentJob.query.filter(EnrichmentJob.status != 'done').all()
+            problems.extend(f"job {job.kind} {job.target_id} is {job.status}: {job.error}" for job in failed)
+
+            book = db.session.get(Book, books[0].id)
+            filled = {'cover_image_url': book.cover_image_url, 'page_count': book.page_count,
+                      'published_date': book.published_date, 'description': book.description.text_en}
+            wanted = {'cover_image_url': STUB_VOLUME['imageLinks']['thumbnail'], 'page_count': STUB_VOLUME['pageCount'],
+                      'published_date': STUB_VOLUME['publishedDate'], 'description': STUB_VOLUME['description']}
+            if filled != wanted:
+                problems.append(f"book was enriched with {filled}, expected {wanted}")
+            # Both books get the stub's ISBN, only the first may keep it
+            isbns = sorted(isbn or '' for isbn, in db.session.query(Book.isbn))
+            if isbns != ['', '9780000000002']:
+                problems.append(f"book ISBNs are {isbns}")
+            if db.session.get(Author, author.id).image_url != STUB_THUMBNAIL:
+                problems.append("author image was not set")
+
+            server.requests.clear()
+            with app.test_request_context():
+                map_book_data(db.session.get(Book, books[0].id), user.id)
+            if db.session.query(EnrichmentJob).filter(EnrichmentJob.status == 'pending').count():
+                problems.append("an enriched book was queued again")
+
+            unavailable = Book(title=Translation(text_en=f'{STUB_UNAVAILABLE} Book', text_de=''),
+                               description=Translation(text_en='', text_de=''), author=author)
+            db.session.add(unavailable)
+            db.session.commit()
+            with app.test_request_context():
+                map_book_data(unavailable, user.id)
+            process_pending_enrichments()
+            job = EnrichmentJob.query.filter_by(kind='book', target_id=unavailable.id).one()
+            if job.status != 'failed':
+                problems.append(f"a job whose API request failed is {job.status}, expected failed")
+    finally:
+        server.shutdown()
+        os.unlink(database.name)
+
+    for problem in problems:
+        print(f"  {problem}")
+    print("Enrichment check " + ('ok' if not problems else 'FAILED'))
+    return not problems
+
+
+if __name__ == '__main__':
+    if '--serve' in sys.argv:
+        port = int(os.environ.get('STUB_API_PORT', 8765))
+        stub = StubAPIServer(port)
+        print(f"GOOGLE_BOOKS_API_URL={stub.google_books_url}")
+        print(f"WIKIPEDIA_API_URL={stub.wikipedia_url}")
+        stub.serve_forever()
+    else:
+        sys.exit(0 if run_check() else 1)
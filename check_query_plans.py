@@ -0,0 +1,120 @@
+import re
+import sys
+import warnings
+from sqlalchemy import event
+from app import app, db
+from models import User, Author, List
+
+warnings.filterwarnings('ignore')
+
+# EXPLAIN QUERY PLAN check for the hot query shapes (SQLite only). Every SELECT a
+# route issues is explained; the route must use each index listed for it, and no
+# statement may fall back to scanning one of the large association tables.
+
+HOT_ROUTES = [
+    ('home', '/', ['ix_user_books_user_id_read_date']),
+    ('my_read_books', '/my_read_books', ['ix_user_books_user_id_read_date']),
+    ('goal_progress', '/goal/goal_progress', []),
+    ('list_detail', '/list/{list_id}', ['ix_book_list_list_id_rank']),
+    ('list_detail by title', '/list/{list_id}?sort=title', ['ix_book_list_list_id_rank']),
+    ('author_detail', '/author/{author_id}', ['ix_books_author_id_is_main_work']),
+    ('authors by books_count', '/author/authors?sort=books_count', ['ix_books_author_id_is_main_work']),
+    ('user_profile', '/profile/{username}', ['ix_activities_user_id_occurred_at']),
+    ('timeline', '/timeline', ['ix_timeline_entries_user_id_occurred_at']),
+]
+
+# The followers table backs relationships rather than a route yet
+FOLLOWER_QUERIES = [
+    ('followed by user', lambda user: user.followed.all(), ['sqlite_autoindex_followers_1']),
+    ('followers of user', lambda user: user.followers.all(), ['ix_followers_followed_id_follower_id']),
+]
+
+NO_SCAN_TABLES = ('user_books', 'book_list', 'followers', 'activities', 'timeline_entries')
+
+
+class StatementRecorder:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            self.statements.append((statement, parameters))
+
+    def reset(self):
+        self.statements = []
+
+
+def explain(statements):
+    """``(statement, plan lines)`` for every recorded statement."""
+    connection = db.session.connection()
+    plans = []
+    for statement, parameters in statements:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+        plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+def check_plans(name, plans, expected_indexes):
+    problems = []
+    details = [detail for _, lines in plans for detail in lines]
+    for index in expected_indexes:
+        if not any(re.search(rf'\b{index}\b', detail) for detail in details):
+            problems.append(f"does not use {index}")
+    for statement, lines in plans:
+        for detail in lines:
+            if any(re.match(rf'SCAN {table}\b', detail) for table in NO_SCAN_TABLES):
+                problems.append(f"{detail} in: {' '.join(statement.split())[:120]}")
+
+    print(f"{name}: {len(plans)} queries, {'ok' if not problems else 'FAILED'}")
+    for problem in problems:
+        print(f"  {problem}")
+    return not problems
+
+
+def run_checks():
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("EXPLAIN QUERY PLAN checks only run against SQLite.")
+            return True
+        recorder = StatementRecorder(db.engine)
+        user = User.query.filter_by(username='test').first()
+        author = Author.query.first()
+        book_list = List.query.first()
+        if not (user and author and book_list):
+            print("The database needs the test user, an author and a list to check query plans.")
+            return False
+        author_id, list_id, username = author.id, book_list.id, user.username
+
+    client = app.test_client()
+    # Warm up the session and the test user login
+    client.get('/')
+
+    results = []
+    for name, url, expected_indexes in HOT_ROUTES:
+        recorder.reset()
+        response = client.get(url.format(author_id=author_id, list_id=list_id, username=username))
+        if response.status_code != 200:
+            print(f"{name}: status {response.status_code}")
+            results.append(False)
+            continue
+        with app.app_context():
+            results.append(check_plans(name, explain(recorder.statements), expected_indexes))
+
+    with app.app_context():
+        user = db.session.get(User, user.id)
+        for name, run_query, expected_indexes in FOLLOWER_QUERIES:
+            recorder.reset()
+            run_query(user)
+            results.append(check_plans(name, explain(recorder.statements), expected_indexes))
+
+    print()
+    if all(results):
+        print("All hot queries use their indexes.")
+    else:
+        print("Some hot queries do not use their indexes.")
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run_checks() else 1)
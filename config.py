@@ -1,6 +1,68 @@
 import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Database and API settings shared by the app, the workers and the import scripts.
+# DATABASE_URL selects the backend (SQLite in instance/app.db by default).
+#
+# SQLite connections run in WAL mode so readers never block the writer, with
+# synchronous=NORMAL (safe in WAL, fsyncs only at checkpoints) and a busy_timeout
+# so a request toggling a read status waits for an import batch to commit
+# instead of failing with "database is locked". PostgreSQL gets a bounded
+# connection pool with pre-ping, so stale connections are replaced transparently.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB, i.e. 64 MB of page cache per connection
+    'cache_size': -64 * 1024,
+    'busy_timeout': 30000,
+}
+
+POSTGRES_POOL_OPTIONS = {
+    'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', 20)),
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+
+# External APIs queried by the enrichment worker. Point them at a local stub
+# server (see check_enrichment.py) to run the worker without network access.
+GOOGLE_BOOKS_API_URL = os.environ.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes')
+WIKIPEDIA_API_URL = os.environ.get('WIKIPEDIA_API_URL', 'https://en.wikipedia.org/w/api.php')
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    # Heroku/Replit style URLs use the scheme SQLAlchemy dropped
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    if url.startswith('postgresql'):
+        return dict(POSTGRES_POOL_OPTIONS)
+    return {}
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'  # Passen Sie dies an Ihre Datenbankeinstellungen an
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    # Fügen Sie hier weitere Konfigurationsoptionen hinzu
\ No newline at end of file
+    GOOGLE_BOOKS_API_URL = GOOGLE_BOOKS_API_URL
+    WIKIPEDIA_API_URL = WIKIPEDIA_API_URL
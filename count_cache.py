@@ -0,0 +1,67 @@
+import hashlib
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select, func
+from models import db
+
+# Row counts for paginated views, cached per normalized query. Writes do not
+# touch any shared state: a caller whose count depends on a versioned row passes
+# that version (e.g. a list's version for searches within the list), so a change
+# simply stops matching the old entry. Every entry also expires after
+# COUNT_CACHE_TTL, which bounds how stale catalog-wide page totals can get.
+# Counts that depend on the current user are not cached at all.
+
+COUNT_CACHE_SIZE = 1024
+COUNT_CACHE_TTL = 60  # seconds
+# Estimated totals count at most this many pages past the current one
+ESTIMATE_PAGES_AHEAD = 5
+
+_counts = OrderedDict()
+
+
+def _cache_key(statement):
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = sorted((key, repr(value)) for key, value in compiled.params.items())
+    return hashlib.sha1(repr((compiled.string, params)).encode()).hexdigest()
+
+
+def count_rows(query, version=None):
+    """Exact ``query.count()``, cached per query and ``version`` for up to COUNT_CACHE_TTL seconds."""
+    query = query.order_by(None)
+    key = (_cache_key(query.statement), version)
+    cached = _counts.get(key)
+    if cached is not None:
+        counted_at, total = cached
+        if time.monotonic() - counted_at <= COUNT_CACHE_TTL:
+            _counts.move_to_end(key)
+            return total
+        del _counts[key]
+
+    total = query.count()
+    _counts[key] = (time.monotonic(), total)
+    while len(_counts) > COUNT_CACHE_SIZE:
+        _counts.popitem(last=False)
+    return total
+
+
+def estimate_rows(query, page, per_page):
+    """Count rows only up to a few pages past ``page``.
+
+    Returns ``(total, exact)``; when ``exact`` is False there are more rows than ``total``.
+    """
+    limit = (page + ESTIMATE_PAGES_AHEAD) * per_page
+    capped = query.order_by(None).limit(limit + 1).subquery()
+    total = db.session.execute(select(func.count()).select_from(capped)).scalar()
+    if total > limit:
+        return limit, False
+    return total, True
+
+
+def estimate_search_totals(search_query):
+    """Whether a search should show an estimated total, opt-in with SEARCH_ESTIMATED_TOTALS."""
+    return bool(search_query) and current_app.config.get('SEARCH_ESTIMATED_TOTALS', False)
+
+
+def invalidate_count_cache():
+    _counts.clear()
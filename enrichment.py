@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import db, insert_ignoring_conflicts, EnrichmentJob
+
+# Books and authors with missing metadata are completed from Google Books and
+# Wikipedia by a background worker (enrichment_jobs.py, run by import_worker.py),
+# so rendering a page never waits for a third-party API. Views only enqueue.
+#
+# enrichment_jobs holds one row per book or author: enqueueing something that is
+# already pending or running does nothing, and a finished job is only queued
+# again once it is ENRICHMENT_RETRY_AFTER old, since the APIs may simply not
+# know the missing fields. The worker retries failed jobs sooner by itself.
+
+ENRICHMENT_RETRY_AFTER = timedelta(days=7)
+
+
+def book_needs_enrichment(book):
+    return not all([book.isbn, book.cover_image_url, book.page_count, book.published_date,
+                    book.description and book.description.text_en])
+
+
+def author_needs_enrichment(author):
+    return not author.image_url
+
+
+def enqueue_enrichment(kind, target_ids):
+    """Queue enrichment of the books or authors (``kind``) with ``target_ids``, skipping queued ones.
+
+    Jobs are written in their own short transaction, so rendering never commits the
+    request's session. Call it before the request writes anything, on SQLite the
+    insert would otherwise wait for the session's write lock.
+    """
+    target_ids = set(target_ids)
+    if not target_ids:
+        return
+    jobs = dict(db.session.query(EnrichmentJob.target_id, EnrichmentJob.finished_at)
+                .filter(EnrichmentJob.kind == kind, EnrichmentJob.target_id.in_(target_ids)))
+
+    retry_before = datetime.utcnow() - ENRICHMENT_RETRY_AFTER
+    stale = [target_id for target_id, finished_at in jobs.items()
+             if finished_at is not None and finished_at < retry_before]
+    new_ids = target_ids - jobs.keys()
+    if not (stale or new_ids):
+        return
+
+    with db.engine.begin() as connection:
+        if stale:
+            connection.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.kind == kind, EnrichmentJob.target_id.in_(stale),
+                       EnrichmentJob.status.in_(('done', 'failed')))
+                .values(status='pending', attempts=0, created_at=datetime.utcnow(), finished_at=None)
+            )
+        if new_ids:
+            # Targets another request queued in the meantime are skipped
+            connection.execute(insert_ignoring_conflicts(connection, EnrichmentJob), [
+                {'kind': kind, 'target_id': target_id, 'status': 'pending', 'attempts': 0}
+                for target_id in sorted(new_ids)
+            ])
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import update, and_, or_
+from models import db, EnrichmentJob, Author, Book
+from utils import fetch_google_books_info, get_author_image_from_wikimedia
+
+# Worker side of the enrichment queue (see enrichment.py). Jobs are claimed one
+# at a time like import jobs, so several workers can share the queue, and
+# spaced by ENRICHMENT_REQUEST_INTERVAL to stay within the APIs' rate limits.
+# A pass handles at most ENRICHMENT_BATCH_SIZE jobs so queued CSV imports are
+# not held up behind a long enrichment backlog.
+#
+# A failed job is claimed again after ENRICHMENT_RETRY_DELAY, and a job still
+# running after ENRICHMENT_JOB_TIMEOUT (its worker was killed) is reclaimed,
+# both until it has been tried ENRICHMENT_MAX_ATTEMPTS times. Jobs out of
+# attempts stay failed until enqueue_enrichment queues them again.
+
+ENRICHMENT_BATCH_SIZE = 20
+ENRICHMENT_REQUEST_INTERVAL = 0.7  # seconds
+ENRICHMENT_JOB_TIMEOUT = timedelta(minutes=10)
+ENRICHMENT_RETRY_DELAY = timedelta(minutes=30)
+ENRICHMENT_MAX_ATTEMPTS = 3
+
+
+def _claimable(now):
+    retries_left = EnrichmentJob.attempts < ENRICHMENT_MAX_ATTEMPTS
+    return or_(
+        EnrichmentJob.status == 'pending',
+        and_(EnrichmentJob.status == 'failed', retries_left,
+             EnrichmentJob.finished_at < now - ENRICHMENT_RETRY_DELAY),
+        and_(EnrichmentJob.status == 'running', retries_left,
+             EnrichmentJob.started_at < now - ENRICHMENT_JOB_TIMEOUT),
+    )
+
+
+def claim_next_enrichment():
+    """Atomically move the oldest claimable job to running, so parallel workers never share a job."""
+    while True:
+        now = datetime.utcnow()
+        # Abandoned jobs without attempts left are given up
+        db.session.execute(
+            update(EnrichmentJob)
+            .where(EnrichmentJob.status == 'running',
+                   EnrichmentJob.attempts >= ENRICHMENT_MAX_ATTEMPTS,
+                   EnrichmentJob.started_at < now - ENRICHMENT_JOB_TIMEOUT)
+            .values(status='failed', error='Timed out', finished_at=now)
+        )
+        job_id = db.session.query(EnrichmentJob.id)\
+            .filter(_claimable(now))\
+            .order_by(EnrichmentJob.created_at, EnrichmentJob.id)\
+            .limit(1).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(EnrichmentJob)
+            .where(EnrichmentJob.id == job_id, _claimable(now))
+            .values(status='running', started_at=now, finished_at=None,
+                    attempts=EnrichmentJob.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(EnrichmentJob, job_id)
+
+
+def _enrich_book(book):
+    # Timeouts, 429s and 5xx raise, so the job fails and is retried instead of counting as no match
+    book_info = fetch_google_books_info(book.title.text_en, book.author.name.text_en, raise_errors=True)
+    if not book_info:
+        return
+    isbn = book_info.get('isbn')
+    if not book.isbn and isbn and len(isbn) <= 13 and \
+            not db.session.query(Book.id).filter(Book.isbn == isbn).first():
+        book.isbn = isbn
+    book.cover_image_url = book.cover_image_url or book_info.get('cover_image_url')
+    book.page_count = book.page_count or book_info.get('page_count')
+    book.published_date = book.published_date or book_info.get('published_date')
+
+    description = book.description
+    description.text_en = description.text_en or book_info.get('description_en') or ''
+    description.text_de = description.text_de or book_info.get('description_de') or ''
+
+
+def _enrich_author(author):
+    if not author.image_url:
+        author.image_url = get_author_image_from_wikimedia(author.name.text_en)
+
+
+def run_enrichment_job(job):
+    try:
+        if job.kind == 'book':
+            book = db.session.get(Book, job.target_id)
+            if book is not None:
+                _enrich_book(book)
+        elif job.kind == 'author':
+            author = db.session.get(Author, job.target_id)
+            if author is not None:
+                _enrich_author(author)
+        else:
+            raise ValueError(f'Unknown enrichment kind: {job.kind}')
+        job.status = 'done'
+        job.error = None
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def process_pending_enrichments(limit=ENRICHMENT_BATCH_SIZE):
+    """Run up to ``limit`` queued enrichment jobs, returns how many were processed."""
+    processed = 0
+    while processed < limit:
+        if processed:
+            time.sleep(ENRICHMENT_REQUEST_INTERVAL)
+        job = claim_next_enrichment()
+        if job is None:
+            break
+        run_enrichment_job(job)
+        processed += 1
+    return processed
@@ -1,13 +1,18 @@
 import os
 import csv
 import zipfile
-from sqlalchemy import create_engine, inspect, text
+from flask import Flask
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from config import Config
 from models import db, User, Book, Author, List, UserBook
 
-# Get database connection details from environment variables
-database_url = os.environ.get('DATABASE_URL')
+# Export the database the app and the import scripts are configured for
+app = Flask(__name__)
+app.config.from_object(Config)
+db.init_app(app)
+app.app_context().push()
 
 # Create a timestamp for the backup files
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -15,8 +20,8 @@ backup_folder = f"database_backup_{timestamp}"
 os.makedirs(backup_folder, exist_ok=True)
 
 try:
-    # Create SQLAlchemy engine
-    engine = create_engine(database_url)
+    # Use the configured SQLAlchemy engine
+    engine = db.engine
     Session = sessionmaker(bind=engine)
     session = Session()
 
@@ -0,0 +1,75 @@
+import re
+from collections import Counter, defaultdict
+from fuzzywuzzy import fuzz
+from sqlalchemy.orm import joinedload
+from models import db, Author, Book, Translation
+
+# In-memory trigram index used by the CSV import to narrow fuzzy matching down
+# to a handful of candidates instead of scoring every author/book in the catalog.
+# Each import job builds its own CatalogIndex, so a long-running worker always
+# matches against the catalog as it is when the job starts.
+
+FUZZY_MATCH_THRESHOLD = 80
+CANDIDATE_LIMIT = 20
+
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', (text or '').lower()).strip()
+
+
+def _ngrams(text, n=3):
+    padded = f' {_normalize(text)} '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class NgramIndex:
+    def __init__(self, entries):
+        """Index ``(key, texts)`` pairs by the trigrams of their texts."""
+        self.postings = defaultdict(set)
+        self.texts = {}
+        for key, texts in entries:
+            texts = [text for text in texts if text]
+            self.texts[key] = texts
+            for text in texts:
+                for gram in _ngrams(text):
+                    self.postings[gram].add(key)
+
+    def candidates(self, query, limit=CANDIDATE_LIMIT):
+        counts = Counter()
+        for gram in _ngrams(query):
+            counts.update(self.postings.get(gram, ()))
+        return [key for key, _ in counts.most_common(limit)]
+
+    def best_match(self, query, threshold=FUZZY_MATCH_THRESHOLD, limit=CANDIDATE_LIMIT):
+        """Return ``(key, ratio)`` of the best partial_ratio match among the candidates, or ``(None, ratio)``."""
+        best_key = None
+        best_ratio = 0
+        for key in self.candidates(query, limit):
+            ratio = max((fuzz.partial_ratio(text, query) for text in self.texts[key]), default=0)
+            if ratio > best_ratio:
+                best_key = key
+                best_ratio = ratio
+        if best_ratio < threshold:
+            return None, best_ratio
+        return best_key, best_ratio
+
+
+class CatalogIndex:
+    def __init__(self):
+        authors = Author.query.options(joinedload(Author.name)).all()
+        self.authors = NgramIndex((author.id, [author.name.text_en, author.name.text_de]) for author in authors)
+
+        self._titles_by_author = defaultdict(list)
+        titles = db.session.query(Book.id, Book.author_id, Translation.text_en, Translation.text_de)\
+            .join(Translation, Book.title_id == Translation.id)
+        for book_id, author_id, text_en, text_de in titles:
+            self._titles_by_author[author_id].append((book_id, [text_en, text_de]))
+        self._book_indexes = {}
+
+    def match_author(self, name):
+        return self.authors.best_match(name)
+
+    def match_book(self, author_id, title):
+        if author_id not in self._book_indexes:
+            self._book_indexes[author_id] = NgramIndex(self._titles_by_author.get(author_id, []))
+        return self._book_indexes[author_id].best_match(title)
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from flask import current_app, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Uploaded images are stored on disk under their SHA-256, so the database row only
+# keeps the hash and identical uploads share one file. A hash never changes its
+# content, which lets /images/<hash> be cached by browsers forever.
+#
+# Files are sharded by the first two byte pairs of the hash (ab/cd/abcd...) to
+# keep directories small. The original is only kept to rebuild variants: pages
+# are served the resized WebP/JPEG variants written next to it at upload, which
+# are re-encoded without the EXIF and other metadata of the upload.
+
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Bounding box per variant, avatars are cropped to fill theirs
+IMAGE_VARIANTS = {
+    'avatar': ((192, 192), True),
+    'card': ((480, 480), False),
+    'full': ((1600, 1600), False),
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def is_image_hash(value):
+    return bool(value) and _HASH_PATTERN.fullmatch(value) is not None
+
+
+def image_path(image_hash):
+    if not is_image_hash(image_hash):
+        raise ValueError(f'Invalid image hash: {image_hash!r}')
+    folder = current_app.config['IMAGE_STORE_FOLDER']
+    return os.path.join(folder, image_hash[:2], image_hash[2:4], image_hash)
+
+
+def image_exists(image_hash):
+    return is_image_hash(image_hash) and os.path.exists(image_path(image_hash))
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def variant_path(image_hash, variant, extension):
+    if variant not in IMAGE_VARIANTS or extension not in VARIANT_FORMATS:
+        raise ValueError(f'Unknown image variant: {variant}.{extension}')
+    return f'{image_path(image_hash)}.{variant}.{extension}'
+
+
+def _write_file(path, data):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # Write to a temporary file first so a reader never sees a partial image
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _open_image(data):
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e)) from e
+    # Apply the EXIF orientation before the metadata is dropped
+    return ImageOps.exif_transpose(image)
+
+
+def _encode_variant(image, size, crop, extension):
+    if crop:
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+
+    image_format, _, options = VARIANT_FORMATS[extension]
+    if image_format == 'JPEG' and resized.mode != 'RGB':
+        # JPEG has no alpha channel, flatten transparent images onto white
+        rgba = resized.convert('RGBA')
+        resized = Image.new('RGB', rgba.size, (255, 255, 255))
+        resized.paste(rgba, mask=rgba.getchannel('A'))
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if 'transparency' in resized.info or 'A' in resized.mode else 'RGB')
+
+    output = BytesIO()
+    # Encoding a fresh image without exif/icc arguments writes no metadata
+    resized.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def store_variants(image_hash, image):
+    for variant, (size, crop) in IMAGE_VARIANTS.items():
+        for extension in VARIANT_FORMATS:
+            path = variant_path(image_hash, variant, extension)
+            if not os.path.exists(path):
+                _write_file(path, _encode_variant(image, size, crop, extension))
+
+
+def store_image(data):
+    """Write ``data`` and its variants to the store unless they are already there, returns its hash.
+
+    Raises InvalidImage if ``data`` cannot be decoded.
+    """
+    image = _open_image(data)
+    image_hash = hashlib.sha256(data).hexdigest()
+    path = image_path(image_hash)
+    if not os.path.exists(path):
+        _write_file(path, data)
+    store_variants(image_hash, image)
+    return image_hash
+
+
+def ensure_variants(image_hash):
+    """Build missing variants of an image stored before they existed, False if it is not in the store."""
+    if not image_exists(image_hash):
+        return False
+    if not all(os.path.exists(variant_path(image_hash, variant, extension))
+               for variant in IMAGE_VARIANTS for extension in VARIANT_FORMATS):
+        with open(image_path(image_hash), 'rb') as image_file:
+            store_variants(image_hash, _open_image(image_file.read()))
+    return True
+
+
+def profile_image_url(user, variant='avatar'):
+    if user.profile_image_hash:
+        return url_for('home.image', image_hash=user.profile_image_hash, variant=variant)
+    return url_for('home.profile_image', user_id=user.id)
+
+
+def guess_mimetype(data):
+    for signature, mimetype in _SIGNATURES:
+        if data.startswith(signature):
+            return mimetype
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
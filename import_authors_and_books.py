@@ -8,26 +8,25 @@ from models import db, Author, Book, UserBook, BookList, User, List, Translation
 import sys
 
 from flask import Flask
+from config import Config
 from utils import fetch_google_books_info, get_author_image_from_wikimedia
+import progress  # noqa: F401 - keeps author and list progress current for the imported books
+import activity_log  # noqa: F401 - logs the created lists
+import timeline  # noqa: F401 - fans the logged activities out to followers
+from catalog_reset import clear_catalog
+from list_ranks import RANK_GAP
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 # Create Flask app
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config)
 db.init_app(app)
 
 with app.app_context():
     # If command arg '--clean_db' is provided, clear the database
     if True: #'--clean_db' in sys.argv:
-        UserBook.query.delete()
-        BookList.query.delete()
-        Book.query.delete()
-        Author.query.delete()
-        List.query.delete()
-        Translation.query.delete()
-        db.session.commit()
+        clear_catalog()
         print("Database has been cleared.")
 
     # If command arg '--setup_db' is provided, set up the new database
@@ -173,7 +172,7 @@ with app.app_context():
                         book_list = BookList.query.filter_by(book_id=bk.id, list_id=list_obj.id).first()
                         if not book_list:
                             book_list = BookList(book_id=bk.id, list_id=list_obj.id)
-                            book_list.rank = list_rank
+                            book_list.rank = list_rank * RANK_GAP
                             db.session.add(book_list)
                             db.session.commit()
 
@@ -1,8 +1,18 @@
 import os
 import csv
+import sys
 import zipfile
-import sqlite3
-from datetime import datetime
+from flask import Flask
+from sqlalchemy import text
+from config import Config
+from models import db
+
+app = Flask(__name__)
+app.config.from_object(Config)
+db.init_app(app)
+
+# Exported columns such as cached JSON can exceed the csv module's default limit
+csv.field_size_limit(sys.maxsize)
 
 
 def import_data_from_backup():
@@ -18,11 +28,8 @@ def import_data_from_backup():
     latest_backup = min(backup_files)
     print(f"Using backup file: {latest_backup}")
 
-    # Connect to the SQLite database
-    conn = sqlite3.connect('app.db')
-    cursor = conn.cursor()
-
-    with zipfile.ZipFile(latest_backup, 'r') as zip_ref:
+    # Import into the configured database in a single transaction
+    with app.app_context(), db.engine.begin() as connection, zipfile.ZipFile(latest_backup, 'r') as zip_ref:
         for file_name in zip_ref.namelist():
             table_name = os.path.splitext(file_name)[0]
             print(f"Importing data for table: {table_name}")
@@ -34,18 +41,17 @@ def import_data_from_backup():
 
                 # Create table if it doesn't exist
                 columns = ', '.join([f"{header} TEXT" for header in headers])
-                cursor.execute(
-                    f"CREATE TABLE IF NOT EXISTS {table_name} ({columns})")
+                connection.execute(
+                    text(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns})"))
 
                 # Insert data
-                for row in csv_reader:
-                    placeholders = ', '.join(['?' for _ in row])
-                    cursor.execute(
-                        f"INSERT INTO {table_name} VALUES ({placeholders})",
-                        row)
-
-    conn.commit()
-    conn.close()
+                placeholders = ', '.join([f":c{i}" for i in range(len(headers))])
+                rows = [{f"c{i}": value for i, value in enumerate(row)} for row in csv_reader]
+                if rows:
+                    connection.execute(
+                        text(f"INSERT INTO {table_name} VALUES ({placeholders})"),
+                        rows)
+
     print("Data import completed successfully.")
 
 
@@ -3,6 +3,7 @@ from models import db, Author, Book, Translation
 from utils import fetch_google_books_info, fetch_google_authors_info, get_author_image_from_wikimedia, search_german_title_bookbrainz
 from flask import Flask
 from config import Config  # Stellen Sie sicher, dass Sie eine config.py Datei haben
+import reading_goals  # noqa: F401 - keeps goal page counts current while page_count is enriched
 
 app = Flask(__name__)
 app.config.from_object(Config)
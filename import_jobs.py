@@ -0,0 +1,249 @@
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+from itertools import islice
+from flask import current_app
+from sqlalchemy import update, func, or_, and_
+from models import db, ImportJob, Author, Book, UserBook, Translation
+from fuzzy_index import CatalogIndex
+
+# CSV imports run outside the request: the upload is saved to disk, a pending
+# import_jobs row is queued and import_worker.py picks it up. The worker streams
+# the file, resolves a batch of rows at a time (exact matches with one query per
+# batch, the n-gram index for the rest) and writes the UserBook rows of each
+# batch in one flush, committing progress after every batch.
+#
+# A job still running after IMPORT_JOB_TIMEOUT lost its worker and is claimed
+# again from the start (the upsert makes re-running rows harmless), until it
+# has been tried IMPORT_MAX_ATTEMPTS times.
+
+IMPORT_BATCH_SIZE = 200
+IMPORT_JOB_TIMEOUT = timedelta(hours=1)
+IMPORT_MAX_ATTEMPTS = 3
+REPORT_COLUMNS = ['Row', 'Title', 'Author', 'Reason']
+
+
+def _import_folder():
+    folder = current_app.config['IMPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def upload_path(job):
+    return os.path.join(_import_folder(), f'{job.id}.csv')
+
+
+def report_path(job):
+    return os.path.join(_import_folder(), f'{job.id}_unmatched.csv')
+
+
+def submit_import_job(user_id, csv_file, mappings, locale):
+    """Save the uploaded file and queue a pending import job for the worker."""
+    job = ImportJob(user_id=user_id, filename=csv_file.filename, mappings=json.dumps(mappings),
+                    locale=str(locale) if locale else None, status='pending',
+                    processed_rows=0, imported_rows=0, unmatched_rows=0)
+    db.session.add(job)
+    db.session.flush()
+    csv_file.save(upload_path(job))
+    db.session.commit()
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest pending or abandoned job to running, so parallel workers never share a job."""
+    while True:
+        now = datetime.utcnow()
+        abandoned = and_(ImportJob.status == 'running', ImportJob.started_at < now - IMPORT_JOB_TIMEOUT)
+        db.session.execute(
+            update(ImportJob)
+            .where(abandoned, ImportJob.attempts >= IMPORT_MAX_ATTEMPTS)
+            .values(status='failed', error='Timed out', finished_at=now)
+        )
+        claimable = or_(ImportJob.status == 'pending', and_(abandoned, ImportJob.attempts < IMPORT_MAX_ATTEMPTS))
+        job_id = db.session.query(ImportJob.id)\
+            .filter(claimable)\
+            .order_by(ImportJob.created_at, ImportJob.id)\
+            .limit(1).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, claimable)
+            .values(status='running', started_at=now, attempts=ImportJob.attempts + 1,
+                    processed_rows=0, imported_rows=0, unmatched_rows=0)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(ImportJob, job_id)
+
+
+def process_pending_jobs():
+    """Run queued jobs until none are left, returns how many were processed."""
+    processed = 0
+    job = claim_next_job()
+    while job is not None:
+        run_import_job(job)
+        processed += 1
+        job = claim_next_job()
+    return processed
+
+
+def _open_upload(job):
+    return open(upload_path(job), newline='', encoding='utf-8')
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def run_import_job(job):
+    try:
+        mappings = json.loads(job.mappings)
+        date_format = '%Y-%m-%d' if job.locale == 'en' else '%d.%m.%Y'
+
+        with _open_upload(job) as upload:
+            job.total_rows = sum(1 for _ in csv.DictReader(upload, delimiter=';'))
+        db.session.commit()
+
+        catalog = CatalogIndex()
+        with _open_upload(job) as upload, open(report_path(job), 'w', newline='', encoding='utf-8') as report:
+            report_writer = csv.writer(report)
+            report_writer.writerow(REPORT_COLUMNS)
+            # Row numbers count the header line so they match what a spreadsheet shows
+            rows = enumerate(csv.DictReader(upload, delimiter=';'), start=2)
+            for batch in _batches(rows, IMPORT_BATCH_SIZE):
+                parsed = [(row_number, _parse_row(row, mappings)) for row_number, row in batch]
+                matched, unmatched = _resolve_batch(catalog, parsed)
+                imported = _upsert_user_books(job.user_id, matched, date_format)
+
+                report_writer.writerows(unmatched)
+                report.flush()
+                job.processed_rows += len(batch)
+                job.imported_rows += imported
+                job.unmatched_rows += len(unmatched)
+                db.session.commit()
+
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.exception("Import job %s failed", job.id)
+
+
+def _parse_row(row, mappings):
+    title = row.get(mappings['title']) or ''
+    author_name = row.get(mappings['author']) or ''
+    return {
+        'title': title.split(';[(')[0].strip(),
+        'author': author_name.split(',;[(')[0].strip(),
+        'read_date': row.get(mappings['read_date']),
+        'rating': row.get(mappings.get('rating', ''), None),
+        'review': row.get(mappings.get('review', ''), None)
+    }
+
+
+def _resolve_batch(catalog, parsed):
+    """Split parsed rows into ``(book_id, row)`` matches and report lines for rows without a match."""
+    matched = []
+    unmatched = []
+    rows = []
+    for row_number, row in parsed:
+        if not row['title'] or not row['author']:
+            unmatched.append([row_number, row['title'], row['author'], 'missing title or author'])
+        else:
+            rows.append((row_number, row))
+
+    author_names = {row['author'].lower() for _, row in rows}
+    authors_by_name = {}
+    if author_names:
+        for author_id, text_en, text_de in db.session.query(Author.id, Translation.text_en, Translation.text_de)\
+                .join(Translation, Author.name_id == Translation.id)\
+                .filter(or_(func.lower(Translation.text_en).in_(author_names),
+                            func.lower(Translation.text_de).in_(author_names))):
+            for text in (text_en, text_de):
+                if text:
+                    authors_by_name.setdefault(text.lower(), author_id)
+
+    resolved_authors = []
+    for row_number, row in rows:
+        author_id = authors_by_name.get(row['author'].lower())
+        if author_id is None:
+            author_id = catalog.match_author(row['author'])[0]
+        if author_id is None:
+            unmatched.append([row_number, row['title'], row['author'], 'author not found'])
+        else:
+            resolved_authors.append((row_number, row, author_id))
+
+    titles = {row['title'].lower() for _, row, _ in resolved_authors}
+    books_by_title = {}
+    if titles:
+        for book_id, author_id, text_en, text_de in db.session.query(
+                    Book.id, Book.author_id, Translation.text_en, Translation.text_de)\
+                .join(Translation, Book.title_id == Translation.id)\
+                .filter(Book.author_id.in_({author_id for _, _, author_id in resolved_authors}),
+                        or_(func.lower(Translation.text_en).in_(titles),
+                            func.lower(Translation.text_de).in_(titles))):
+            for text in (text_en, text_de):
+                if text:
+                    books_by_title.setdefault((author_id, text.lower()), book_id)
+
+    for row_number, row, author_id in resolved_authors:
+        book_id = books_by_title.get((author_id, row['title'].lower()))
+        if book_id is None:
+            book_id = catalog.match_book(author_id, row['title'])[0]
+        if book_id is None:
+            unmatched.append([row_number, row['title'], row['author'], 'book not found'])
+        else:
+            matched.append((book_id, row))
+
+    unmatched.sort(key=lambda line: line[0])
+    return matched, unmatched
+
+
+def _upsert_user_books(user_id, matched, date_format):
+    """Insert or update the user's UserBook rows for one batch, returns how many rows were imported."""
+    if not matched:
+        return 0
+    book_ids = {book_id for book_id, _ in matched}
+    user_books = {
+        user_book.book_id: user_book
+        for user_book in UserBook.query.filter(UserBook.user_id == user_id, UserBook.book_id.in_(book_ids))
+    }
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids))}
+
+    # Rows are applied in file order, a book listed twice ends up with its latest values
+    for book_id, row in matched:
+        values = {}
+        if row['read_date']:
+            try:
+                values['read_date'] = datetime.strptime(row['read_date'], date_format).date()
+            except ValueError:
+                pass
+        if row['rating']:
+            try:
+                values['rating'] = float(row['rating'])
+            except ValueError:
+                pass
+        if row['review']:
+            values['review'] = row['review']
+
+        user_book = user_books.get(book_id)
+        if user_book is None:
+            user_book = user_books[book_id] = UserBook(user_id=user_id, book_id=book_id)
+            db.session.add(user_book)
+        if 'rating' in values:
+            books[book_id].record_rating_change(user_book.rating, values['rating'])
+        for key, value in values.items():
+            setattr(user_book, key, value)
+
+    db.session.flush()
+    return len(matched)
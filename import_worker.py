@@ -0,0 +1,34 @@
+import sys
+import time
+from app import app
+from import_jobs import process_pending_jobs
+from enrichment_jobs import process_pending_enrichments
+from timeline import trim_inboxes
+
+POLL_INTERVAL = 2  # seconds
+TRIM_INTERVAL = 10 * 60  # seconds between timeline inbox trims
+
+
+def run_worker(once=False):
+    with app.app_context():
+        next_trim = 0
+        while True:
+            processed = process_pending_jobs()
+            if processed:
+                print(f"Processed {processed} import job(s)")
+            enriched = process_pending_enrichments()
+            if enriched:
+                print(f"Processed {enriched} enrichment job(s)")
+            if time.monotonic() >= next_trim:
+                trimmed = trim_inboxes()
+                if trimmed:
+                    print(f"Trimmed {trimmed} timeline entries")
+                next_trim = time.monotonic() + TRIM_INTERVAL
+            if once:
+                return processed + enriched
+            if not enriched:
+                time.sleep(POLL_INTERVAL)
+
+
+if __name__ == '__main__':
+    run_worker(once='--once' in sys.argv)
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from flask import request, abort
+from sqlalchemy import and_, or_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+from count_cache import count_rows, estimate_rows
+
+# Keyset ("seek") pagination: instead of OFFSET, a page starts right after the
+# sort key of the last row shown, so deep pages cost the same as the first one
+# and no COUNT(*) is needed. The sort key travels in an opaque cursor.
+#
+# Views pass their ORDER BY clauses; every column may be ascending or
+# descending, but must not be NULL (wrap nullable columns in coalesce) and the
+# last one has to be unique, e.g. the primary key.
+#
+# The seek only skips the OFFSET scan if an index covers the sort key. Sorts on
+# coalesced translations or on aggregates (compared in HAVING) have none, so
+# each page still sorts all matching rows; the cursor keeps pages stable.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPagination:
+    def __init__(self, items, per_page, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.has_next = next_cursor is not None
+        self.has_prev = prev_cursor is not None
+        # Page numbers are unknown without counting, templates only show them when set
+        self.page = self.pages = self.total = None
+        self.total_is_estimate = False
+        self.prev_num = self.next_num = None
+
+
+def _split_clause(clause):
+    if isinstance(clause, UnaryExpression) and clause.modifier in (operators.desc_op, operators.asc_op):
+        return clause.element, clause.modifier is operators.desc_op
+    return clause, False
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise InvalidCursor(value)
+    return value
+
+
+def encode_cursor(values, before=False):
+    payload = json.dumps({'v': [_encode_value(value) for value in values], 'b': before}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, before)`` from a cursor made by ``encode_cursor``."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return [_decode_value(value) for value in payload['v']], bool(payload.get('b'))
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def _seek_condition(keys, values, before):
+    """Rows strictly after (or before) ``values`` in the order given by ``keys``."""
+    alternatives = []
+    for index, (column, descending) in enumerate(keys):
+        forward = descending == before
+        step = column > values[index] if forward else column < values[index]
+        alternatives.append(and_(*[keys[j][0] == values[j] for j in range(index)], step))
+    return or_(*alternatives)
+
+
+def keyset_paginate(query, order_by, per_page, cursor=None, having=False):
+    """Return one page of ``query`` sorted by ``order_by``, starting at ``cursor``.
+
+    Pass ``having=True`` when the sort columns are aggregates of a grouped query.
+    """
+    keys = [_split_clause(clause) for clause in order_by]
+    entity_count = len(query.column_descriptions)
+    before = False
+
+    query = query.add_columns(*[column for column, _ in keys])
+    if cursor:
+        values, before = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor(cursor)
+        condition = _seek_condition(keys, values, before)
+        query = query.having(condition) if having else query.filter(condition)
+
+    query = query.order_by(None).order_by(*[
+        column.desc() if descending != before else column.asc() for column, descending in keys
+    ])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    items = [row[0] if entity_count == 1 else tuple(row[:entity_count]) for row in rows]
+    first_key = list(rows[0][entity_count:]) if rows else None
+    last_key = list(rows[-1][entity_count:]) if rows else None
+
+    if before:
+        next_cursor = encode_cursor(last_key) if rows else None
+        prev_cursor = encode_cursor(first_key, before=True) if has_more else None
+    else:
+        next_cursor = encode_cursor(last_key) if has_more else None
+        prev_cursor = encode_cursor(first_key, before=True) if cursor and rows else None
+    return KeysetPagination(items, per_page, next_cursor, prev_cursor)
+
+
+def paginate(query, order_by, per_page, page=None, keyset=None, having=False, total=None, estimate=False,
+             cache_count=True):
+    """Paginate a view's query by cursor, or by page number when one is requested.
+
+    Without an explicit ``keyset`` flag, a ``page`` argument (passed in or in the
+    request) selects OFFSET pagination, otherwise the ``cursor`` request argument
+    is used. Both results expose ``items``, ``has_prev``/``has_next`` and
+    ``prev_cursor``/``next_cursor`` plus the page numbers of offset pagination.
+
+    Offset pages take their total from ``total`` if the caller already counted,
+    from the count cache otherwise (pass ``cache_count=False`` for queries that
+    depend on the current user), or with ``estimate`` from a capped count
+    (``total_is_estimate`` is then set when there are more rows).
+    """
+    if page is None and 'page' in request.args:
+        page = request.args.get('page', 1, type=int)
+    if keyset is None:
+        keyset = page is None
+
+    if not keyset:
+        page = max(page or 1, 1)
+        pagination = query.order_by(*order_by).paginate(page=page, per_page=per_page, error_out=False, count=False)
+        pagination.total_is_estimate = False
+        if total is not None:
+            pagination.total = total
+        elif estimate:
+            pagination.total, exact = estimate_rows(query, page, per_page)
+            pagination.total_is_estimate = not exact
+        elif cache_count:
+            pagination.total = count_rows(query)
+        else:
+            pagination.total = query.order_by(None).count()
+        pagination.prev_cursor = pagination.next_cursor = None
+        return pagination
+
+    try:
+        return keyset_paginate(query, order_by, per_page, request.args.get('cursor'), having=having)
+    except InvalidCursor:
+        abort(400)
@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+
+# Cache of the user-independent part of public list pages: the books on a page
+# with their titles, authors, covers and ranks, plus the pagination. Entries are
+# keyed by the list's version, which add_book_to_list, remove_book_from_list and
+# update_ranks bump, so a changed list simply stops matching its old entries.
+# Titles, covers and ratings can also change without touching the list, those
+# are picked up once an entry is older than LIST_PAGE_TTL.
+
+LIST_PAGE_CACHE_SIZE = 256
+LIST_PAGE_TTL = 600  # seconds
+# Sorting by read status depends on the user, those pages are never cached
+CACHEABLE_SORTS = ('rank', 'title', 'author', 'rating')
+
+_pages = OrderedDict()
+
+
+class PaginationSnapshot:
+    """The pagination attributes templates use, detached from the query."""
+
+    ATTRIBUTES = ('page', 'pages', 'total', 'total_is_estimate', 'has_prev', 'has_next',
+                  'prev_num', 'next_num', 'prev_cursor', 'next_cursor')
+
+    def __init__(self, pagination):
+        for name in self.ATTRIBUTES:
+            setattr(self, name, getattr(pagination, name, None))
+
+
+def list_page_key(book_list, sort_by, page, cursor, locale):
+    return (book_list.id, book_list.version, sort_by, page, cursor, str(locale))
+
+
+def get_cached_page(key):
+    """Return ``(books, pagination)`` for a cached page, or None."""
+    entry = _pages.get(key)
+    if entry is None:
+        return None
+    stored_at, books, pagination = entry
+    if time.monotonic() - stored_at > LIST_PAGE_TTL:
+        del _pages[key]
+        return None
+    _pages.move_to_end(key)
+    return books, pagination
+
+
+def store_page(key, books, pagination):
+    _pages[key] = (time.monotonic(), books, PaginationSnapshot(pagination))
+    _pages.move_to_end(key)
+    while len(_pages) > LIST_PAGE_CACHE_SIZE:
+        _pages.popitem(last=False)
+
+
+def invalidate_list_pages():
+    _pages.clear()
@@ -0,0 +1,155 @@
+from sqlalchemy import select, update, func, case
+from models import db, BookList
+
+# book_list.rank only orders a list; the "1st", "2nd", ... shown to users is
+# derived with ROW_NUMBER(). Ranks are spaced RANK_GAP apart so a moved book can
+# take a value between its new neighbours and a removal leaves the other rows
+# alone. Rank 0 still means "unranked". When a gap runs out the list is
+# renumbered in a single UPDATE.
+
+RANK_GAP = 1024
+
+
+def next_rank(list_id):
+    max_rank = db.session.query(func.max(BookList.rank)).filter(BookList.list_id == list_id).scalar()
+    return (max_rank or 0) + RANK_GAP
+
+
+def rank_ordinals(list_id):
+    """Subquery of ``(book_id, ordinal)`` with the display rank of every book in the list, 0 if unranked."""
+    is_ranked = BookList.rank > 0
+    return select(
+        BookList.book_id,
+        case((is_ranked, func.row_number().over(partition_by=is_ranked,
+                                                 order_by=(BookList.rank, BookList.book_id))),
+             else_=0).label('ordinal')
+    ).where(BookList.list_id == list_id).subquery()
+
+
+def rebalance_ranks(list_id):
+    """Respace the ranked books of the list RANK_GAP apart, keeping their order, with one UPDATE.
+
+    Unranked books stay at rank 0.
+    """
+    numbered = select(
+        BookList.book_id,
+        func.row_number().over(order_by=(BookList.rank, BookList.book_id)).label('position')
+    ).where(BookList.list_id == list_id, BookList.rank > 0).subquery()
+    db.session.execute(
+        update(BookList)
+        .where(BookList.list_id == list_id, BookList.rank > 0)
+        .values(rank=select(numbered.c.position * RANK_GAP)
+                .where(numbered.c.book_id == BookList.book_id)
+                .scalar_subquery()),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def _longest_increasing_run(values):
+    """Indexes of a longest strictly increasing subsequence of ``values``."""
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(values)
+    for index, value in enumerate(values):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if tails[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        if low > 0:
+            previous[index] = tail_indexes[low - 1]
+        if low == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[low] = value
+            tail_indexes[low] = index
+    keep = set()
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        keep.add(index)
+        index = previous[index]
+    return keep
+
+
+def _plan_moves(list_id, book_ids, ranks):
+    """New ranks for the books that have to move, or None if a gap is too small."""
+    current = [ranks[book_id] for book_id in book_ids]
+    keep = _longest_increasing_run(current)
+
+    lower_edge = db.session.query(func.max(BookList.rank))\
+        .filter(BookList.list_id == list_id, BookList.rank < min(current)).scalar() or 0
+    upper_edge = db.session.query(func.min(BookList.rank))\
+        .filter(BookList.list_id == list_id, BookList.rank > max(current)).scalar()
+
+    moves = {}
+    run = []
+    lower = lower_edge
+    for index, book_id in enumerate(book_ids + [None]):
+        if book_id is not None and index not in keep:
+            run.append(book_id)
+            continue
+        if book_id is None:
+            upper = upper_edge if upper_edge is not None else lower + RANK_GAP * (len(run) + 1)
+        else:
+            upper = current[index]
+        if run:
+            step = (upper - lower) // (len(run) + 1)
+            if step < 1:
+                return None
+            for offset, moved_id in enumerate(run, start=1):
+                moves[moved_id] = lower + step * offset
+            run = []
+        if book_id is not None:
+            lower = current[index]
+    return moves
+
+
+def reorder_books(list_id, book_ids):
+    """Store ``book_ids`` in the given order, rewriting only the rows that move.
+
+    The books keep their place relative to the rest of the list, unranked ones are
+    first ranked after the last ranked book; returns the number of rows that changed.
+    """
+    book_ids = [int(book_id) for book_id in book_ids]
+    ranks = dict(db.session.query(BookList.book_id, BookList.rank)
+                 .filter(BookList.list_id == list_id, BookList.book_id.in_(book_ids)))
+    book_ids = [book_id for book_id in dict.fromkeys(book_ids) if book_id in ranks]
+    if not book_ids:
+        return 0
+
+    unranked = [book_id for book_id in book_ids if not ranks[book_id]]
+    appended = {}
+    if unranked:
+        last_rank = next_rank(list_id) - RANK_GAP
+        appended = {book_id: last_rank + RANK_GAP * position for position, book_id in enumerate(unranked, start=1)}
+        db.session.execute(
+            update(BookList)
+            .where(BookList.list_id == list_id, BookList.book_id.in_(appended))
+            .values(rank=case(appended, value=BookList.book_id)),
+            execution_options={'synchronize_session': False}
+        )
+        ranks.update(appended)
+
+    moves = None
+    if len(set(ranks.values())) == len(ranks):
+        moves = _plan_moves(list_id, book_ids, ranks)
+    if moves is None:
+        # Tied books, or no room left between neighbours
+        rebalance_ranks(list_id)
+        ranks = dict(db.session.query(BookList.book_id, BookList.rank)
+                     .filter(BookList.list_id == list_id, BookList.book_id.in_(book_ids)))
+        moves = _plan_moves(list_id, book_ids, ranks)
+        if moves is None:
+            raise ValueError('Too many books to move at once')
+
+    if moves:
+        db.session.execute(
+            update(BookList)
+            .where(BookList.list_id == list_id, BookList.book_id.in_(moves))
+            .values(rank=case(moves, value=BookList.book_id)),
+            execution_options={'synchronize_session': False}
+        )
+    return len(moves.keys() | appended.keys())
@@ -0,0 +1,24 @@
+from app import app
+from models import db, User
+from image_store import store_image, InvalidImage
+
+# Moves profile images still stored as blobs on the users table into the image
+# store, keeping only their hash on the row. Safe to run repeatedly: users are
+# committed one at a time and already moved images are skipped. Blobs that are
+# not a readable image are left in place and reported.
+with app.app_context():
+    user_ids = [user_id for user_id, in db.session.query(User.id).filter(User.profile_image.isnot(None))]
+    moved = 0
+    for user_id in user_ids:
+        user = db.session.get(User, user_id)
+        try:
+            user.profile_image_hash = store_image(user.profile_image)
+        except InvalidImage as e:
+            print(f"Skipping user {user.username}: {e}")
+            db.session.expunge(user)
+            continue
+        user.profile_image = None
+        db.session.commit()
+        db.session.expunge(user)
+        moved += 1
+    print(f"Moved {moved} of {len(user_ids)} profile images to {app.config['IMAGE_STORE_FOLDER']}")
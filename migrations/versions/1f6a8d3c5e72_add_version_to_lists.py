@@ -0,0 +1,26 @@
+"""Add version to lists
+
+Revision ID: 1f6a8d3c5e72
+Revises: c7e15a4f3d90
+Create Date: 2026-10-18 18:05:33.170284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6a8d3c5e72'
+down_revision = 'c7e15a4f3d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('lists', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('lists', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,60 @@
+"""Add user_author_progress table
+
+Revision ID: 3c1f8e2a9b47
+Revises: 20b650e5cca0
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f8e2a9b47'
+down_revision = '20b650e5cca0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_author_progress',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.Column('read_books', sa.Integer(), nullable=False),
+    sa.Column('read_main_works', sa.Integer(), nullable=False),
+    sa.Column('total_books', sa.Integer(), nullable=False),
+    sa.Column('total_main_works', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['author_id'], ['authors.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'author_id')
+    )
+    with op.batch_alter_table('user_author_progress', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_author_progress_author_id'), ['author_id'], unique=False)
+
+    # Backfill from the existing reading history
+    op.execute(sa.text("""
+        INSERT INTO user_author_progress (user_id, author_id, read_books, read_main_works, total_books, total_main_works)
+        SELECT r.user_id, r.author_id, r.read_books, r.read_main_works, t.total_books, t.total_main_works
+        FROM (
+            SELECT user_books.user_id AS user_id, books.author_id AS author_id,
+                   COUNT(books.id) AS read_books,
+                   COUNT(CASE WHEN books.is_main_work THEN books.id END) AS read_main_works
+            FROM user_books JOIN books ON books.id = user_books.book_id
+            WHERE user_books.read_date IS NOT NULL
+            GROUP BY user_books.user_id, books.author_id
+        ) AS r
+        JOIN (
+            SELECT author_id,
+                   COUNT(id) AS total_books,
+                   COUNT(CASE WHEN is_main_work THEN id END) AS total_main_works
+            FROM books
+            GROUP BY author_id
+        ) AS t ON t.author_id = r.author_id
+    """))
+
+
+def downgrade():
+    with op.batch_alter_table('user_author_progress', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_author_progress_author_id'))
+
+    op.drop_table('user_author_progress')
@@ -0,0 +1,41 @@
+"""Add enrichment jobs
+
+Revision ID: 3e8b6d2f9a41
+Revises: 9a4c7e2d5f13
+Create Date: 2026-10-18 22:31:06.847291
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8b6d2f9a41'
+down_revision = '9a4c7e2d5f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('enrichment_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'target_id', name='uq_enrichment_jobs_kind_target_id')
+    )
+    with op.batch_alter_table('enrichment_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_enrichment_jobs_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrichment_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_enrichment_jobs_status'))
+
+    op.drop_table('enrichment_jobs')
@@ -0,0 +1,26 @@
+"""Add profile_image_hash to users
+
+Revision ID: 4e8b2f6a9d31
+Revises: 1f6a8d3c5e72
+Create Date: 2026-10-18 19:12:48.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b2f6a9d31'
+down_revision = '1f6a8d3c5e72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_image_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('profile_image_hash')
@@ -0,0 +1,28 @@
+"""Drop table_versions
+
+Revision ID: 5b9d2e7c4f18
+Revises: 3e8b6d2f9a41
+Create Date: 2026-10-19 09:12:44.305182
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9d2e7c4f18'
+down_revision = '3e8b6d2f9a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_table('table_versions')
+
+
+def downgrade():
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
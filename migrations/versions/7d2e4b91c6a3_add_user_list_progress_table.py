@@ -0,0 +1,40 @@
+"""Add user_list_progress table
+
+Revision ID: 7d2e4b91c6a3
+Revises: 3c1f8e2a9b47
+Create Date: 2026-10-18 11:40:07.552913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4b91c6a3'
+down_revision = '3c1f8e2a9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are created on demand the first time a user opens a list
+    op.create_table('user_list_progress',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('list_id', sa.Integer(), nullable=False),
+    sa.Column('read_books', sa.Integer(), nullable=False),
+    sa.Column('read_main_works', sa.Integer(), nullable=False),
+    sa.Column('total_books', sa.Integer(), nullable=False),
+    sa.Column('total_main_works', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['list_id'], ['lists.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'list_id')
+    )
+    with op.batch_alter_table('user_list_progress', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_list_progress_list_id'), ['list_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_list_progress', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_list_progress_list_id'))
+
+    op.drop_table('user_list_progress')
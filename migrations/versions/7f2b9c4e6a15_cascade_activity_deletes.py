@@ -0,0 +1,75 @@
+"""Cascade deletes of books, lists and posts to their activities
+
+Revision ID: 7f2b9c4e6a15
+Revises: c4a8e1f6d372
+Create Date: 2026-10-19 14:02:18.663057
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2b9c4e6a15'
+down_revision = 'c4a8e1f6d372'
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table) of the foreign keys that cascade
+CASCADING_KEYS = [
+    ('activities', 'book_id', 'books'),
+    ('activities', 'list_id', 'lists'),
+    ('activities', 'post_id', 'posts'),
+    ('timeline_entries', 'activity_id', 'activities'),
+]
+
+
+def _activities(ondelete):
+    return sa.Table('activities', sa.MetaData(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=20), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('list_id', sa.Integer(), nullable=True),
+        sa.Column('post_id', sa.Integer(), nullable=True),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete=ondelete),
+        sa.ForeignKeyConstraint(['list_id'], ['lists.id'], ondelete=ondelete),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete=ondelete),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.Index('ix_activities_user_id_occurred_at', 'user_id', 'occurred_at', 'id'),
+    )
+
+
+def _timeline_entries(ondelete):
+    return sa.Table('timeline_entries', sa.MetaData(),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('occurred_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ondelete=ondelete),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'activity_id'),
+        sa.Index('ix_timeline_entries_user_id_occurred_at', 'user_id', 'occurred_at', 'activity_id'),
+    )
+
+
+def _set_ondelete(ondelete):
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite cannot alter a foreign key, the tables are copied (neither has triggers)
+        for table in (_activities(ondelete), _timeline_entries(ondelete)):
+            with op.batch_alter_table(table.name, copy_from=table, recreate='always'):
+                pass
+        return
+    for table, column, referenced in CASCADING_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referenced, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _set_ondelete('CASCADE')
+
+
+def downgrade():
+    _set_ondelete(None)
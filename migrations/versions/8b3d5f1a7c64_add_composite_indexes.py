@@ -0,0 +1,58 @@
+"""Add composite indexes for the hot queries and keys on followers
+
+Revision ID: 8b3d5f1a7c64
+Revises: 4e8b2f6a9d31
+Create Date: 2026-10-18 19:48:21.637092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3d5f1a7c64'
+down_revision = '4e8b2f6a9d31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_books', schema=None) as batch_op:
+        batch_op.create_index('ix_user_books_user_id_read_date', ['user_id', 'read_date', 'book_id'], unique=False)
+
+    with op.batch_alter_table('book_list', schema=None) as batch_op:
+        batch_op.create_index('ix_book_list_list_id_rank', ['list_id', 'rank', 'book_id'], unique=False)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index('ix_books_author_id_is_main_work', ['author_id', 'is_main_work'], unique=False)
+
+    # The primary key needs non-null, unique pairs
+    row_id = 'rowid' if op.get_bind().dialect.name == 'sqlite' else 'ctid'
+    op.execute(f"""
+        DELETE FROM followers
+        WHERE follower_id IS NULL OR followed_id IS NULL OR {row_id} NOT IN (
+            SELECT MIN({row_id}) FROM followers GROUP BY follower_id, followed_id
+        )
+    """)
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.alter_column('follower_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('followed_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('pk_followers', ['follower_id', 'followed_id'])
+        batch_op.create_index('ix_followers_followed_id_follower_id', ['followed_id', 'follower_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('followers', schema=None) as batch_op:
+        batch_op.drop_index('ix_followers_followed_id_follower_id')
+        batch_op.drop_constraint('pk_followers', type_='primary')
+        batch_op.alter_column('followed_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('follower_id', existing_type=sa.Integer(), nullable=True)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ix_books_author_id_is_main_work')
+
+    with op.batch_alter_table('book_list', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_list_list_id_rank')
+
+    with op.batch_alter_table('user_books', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_books_user_id_read_date')
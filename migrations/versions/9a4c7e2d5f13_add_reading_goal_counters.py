@@ -0,0 +1,39 @@
+"""Add reading goal progress counters
+
+Revision ID: 9a4c7e2d5f13
+Revises: 6d1e4a9c3b27
+Create Date: 2026-10-18 21:47:52.630118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c7e2d5f13'
+down_revision = '6d1e4a9c3b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reading_goals', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('books_read', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('pages_read', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('UPDATE reading_goals SET '
+               'books_read = (SELECT COUNT(*) FROM user_books '
+               'WHERE user_books.user_id = reading_goals.user_id '
+               'AND user_books.read_date BETWEEN reading_goals.start_date AND reading_goals.end_date), '
+               'pages_read = (SELECT COALESCE(SUM(books.page_count), 0) FROM user_books '
+               'JOIN books ON books.id = user_books.book_id '
+               'WHERE user_books.user_id = reading_goals.user_id '
+               'AND user_books.read_date BETWEEN reading_goals.start_date AND reading_goals.end_date)')
+
+
+def downgrade():
+    with op.batch_alter_table('reading_goals', schema=None) as batch_op:
+        batch_op.drop_column('version')
+        batch_op.drop_column('pages_read')
+        batch_op.drop_column('books_read')
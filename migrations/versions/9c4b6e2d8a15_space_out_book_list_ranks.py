@@ -0,0 +1,37 @@
+"""Space out book_list ranks
+
+Revision ID: 9c4b6e2d8a15
+Revises: 5a9d3e7f1b26
+Create Date: 2026-10-18 16:11:52.604217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4b6e2d8a15'
+down_revision = '5a9d3e7f1b26'
+branch_labels = None
+depends_on = None
+
+RANK_GAP = 1024
+
+
+def upgrade():
+    # Ranks only order the list now, the displayed rank is derived with ROW_NUMBER()
+    op.execute(sa.text("UPDATE book_list SET rank = rank * :gap WHERE rank > 0").bindparams(gap=RANK_GAP))
+
+
+def downgrade():
+    # Back to consecutive ranks per list, unranked books stay at 0
+    op.execute("""
+        UPDATE book_list SET rank = (
+            SELECT COUNT(*) FROM book_list AS earlier
+            WHERE earlier.list_id = book_list.list_id
+              AND earlier.rank > 0
+              AND (earlier.rank < book_list.rank
+                   OR (earlier.rank = book_list.rank AND earlier.book_id <= book_list.book_id))
+        )
+        WHERE rank > 0
+    """)
@@ -0,0 +1,48 @@
+"""Add rating aggregates to books
+
+Revision ID: b58a0f3d7e12
+Revises: 7d2e4b91c6a3
+Create Date: 2026-10-18 13:05:52.104377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58a0f3d7e12'
+down_revision = '7d2e4b91c6a3'
+branch_labels = None
+depends_on = None
+
+RATING_BUCKETS = 11
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_histogram', sa.JSON(), nullable=True))
+
+    # Backfill from the existing ratings
+    connection = op.get_bind()
+    ratings = connection.execute(sa.text(
+        "SELECT book_id, rating FROM user_books WHERE rating IS NOT NULL")).fetchall()
+    aggregates = {}
+    for book_id, rating in ratings:
+        count, total, histogram = aggregates.get(book_id, (0, 0.0, [0] * RATING_BUCKETS))
+        histogram[min(max(int(round(rating * 2)), 0), RATING_BUCKETS - 1)] += 1
+        aggregates[book_id] = (count + 1, total + rating, histogram)
+    for book_id, (count, total, histogram) in aggregates.items():
+        connection.execute(
+            sa.text("UPDATE books SET rating_count = :count, rating_sum = :total, rating_histogram = :histogram WHERE id = :id"),
+            {"id": book_id, "count": count, "total": total, "histogram": json.dumps(histogram)}
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('rating_histogram')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
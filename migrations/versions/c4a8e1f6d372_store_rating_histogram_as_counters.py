@@ -0,0 +1,63 @@
+"""Store the rating histogram as per-bucket counters
+
+Revision ID: c4a8e1f6d372
+Revises: 5b9d2e7c4f18
+Create Date: 2026-10-19 10:27:31.580914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e1f6d372'
+down_revision = '5b9d2e7c4f18'
+branch_labels = None
+depends_on = None
+
+RATING_BUCKETS = 11
+BUCKET_COLUMNS = [f'rating_bucket_{bucket}' for bucket in range(RATING_BUCKETS)]
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        for column in BUCKET_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing ratings
+    connection = op.get_bind()
+    ratings = connection.execute(sa.text(
+        "SELECT book_id, rating FROM user_books WHERE rating IS NOT NULL")).fetchall()
+    histograms = {}
+    for book_id, rating in ratings:
+        histogram = histograms.setdefault(book_id, [0] * RATING_BUCKETS)
+        histogram[min(max(int(round(rating * 2)), 0), RATING_BUCKETS - 1)] += 1
+    assignments = ', '.join(f'{column} = :{column}' for column in BUCKET_COLUMNS)
+    for book_id, histogram in histograms.items():
+        connection.execute(
+            sa.text(f"UPDATE books SET {assignments} WHERE id = :id"),
+            {"id": book_id, **dict(zip(BUCKET_COLUMNS, histogram))}
+        )
+
+    # A plain DROP COLUMN, copying the table would break the search index triggers on books
+    with op.batch_alter_table('books', schema=None, recreate='never') as batch_op:
+        batch_op.drop_column('rating_histogram')
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_histogram', sa.JSON(), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(
+        f"SELECT id, {', '.join(BUCKET_COLUMNS)} FROM books WHERE rating_count != 0")).fetchall()
+    for book_id, *histogram in rows:
+        connection.execute(
+            sa.text("UPDATE books SET rating_histogram = :histogram WHERE id = :id"),
+            {"id": book_id, "histogram": json.dumps(histogram)}
+        )
+
+    with op.batch_alter_table('books', schema=None, recreate='never') as batch_op:
+        for column in reversed(BUCKET_COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,29 @@
+"""Add table_versions table
+
+Revision ID: c7e15a4f3d90
+Revises: 9c4b6e2d8a15
+Create Date: 2026-10-18 17:24:08.913450
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e15a4f3d90'
+down_revision = '9c4b6e2d8a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are added the first time a table is written to
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,26 @@
+"""Add attempts to import jobs
+
+Revision ID: d81f3a6c9e24
+Revises: 7f2b9c4e6a15
+Create Date: 2026-10-19 15:36:52.208417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f3a6c9e24'
+down_revision = '7f2b9c4e6a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('import_jobs', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
@@ -0,0 +1,76 @@
+"""Add FTS5 search index over translations
+
+Revision ID: e4a7c2d95f08
+Revises: b58a0f3d7e12
+Create Date: 2026-10-18 14:27:16.930051
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d95f08'
+down_revision = 'b58a0f3d7e12'
+branch_labels = None
+depends_on = None
+
+# (table, translation column, entity tag, rowid offset); rowid = id * 4 + offset
+INDEXED_ENTITIES = [
+    ('books', 'title_id', 'book_title', 1),
+    ('authors', 'name_id', 'author_name', 2),
+    ('lists', 'name_id', 'list_name', 3),
+]
+
+
+def upgrade():
+    # FTS5 is SQLite only, other databases keep using ILIKE (see search.py)
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            text_en, text_de, entity UNINDEXED, entity_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+
+    for table, column, entity, offset in INDEXED_ENTITIES:
+        insert_new = f"""
+            INSERT INTO search_index (rowid, text_en, text_de, entity, entity_id)
+            SELECT NEW.id * 4 + {offset}, text_en, text_de, '{entity}', NEW.id
+            FROM translation WHERE id = NEW.{column};
+        """
+        delete_old = f"DELETE FROM search_index WHERE rowid = OLD.id * 4 + {offset};"
+
+        op.execute(f"CREATE TRIGGER search_index_{table}_ai AFTER INSERT ON {table} BEGIN {insert_new} END")
+        op.execute(f"CREATE TRIGGER search_index_{table}_ad AFTER DELETE ON {table} BEGIN {delete_old} END")
+        op.execute(f"CREATE TRIGGER search_index_{table}_au AFTER UPDATE OF {column} ON {table} BEGIN {delete_old} {insert_new} END")
+
+        op.execute(f"""
+            INSERT INTO search_index (rowid, text_en, text_de, entity, entity_id)
+            SELECT {table}.id * 4 + {offset}, translation.text_en, translation.text_de, '{entity}', {table}.id
+            FROM {table} JOIN translation ON translation.id = {table}.{column}
+        """)
+
+    owners = ' UNION ALL '.join(
+        f"SELECT id * 4 + {offset} FROM {table} WHERE {column} = NEW.id"
+        for table, column, entity, offset in INDEXED_ENTITIES
+    )
+    op.execute(f"""
+        CREATE TRIGGER search_index_translation_au AFTER UPDATE OF text_en, text_de ON translation BEGIN
+            UPDATE search_index SET text_en = NEW.text_en, text_de = NEW.text_de
+            WHERE rowid IN ({owners});
+        END
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS search_index_translation_au")
+    for table, column, entity, offset in INDEXED_ENTITIES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS search_index_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
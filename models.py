@@ -2,18 +2,42 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import json
-from flask_babel import get_locale
+from request_context import current_language
+from sqlalchemy import case, inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import hybrid_property
 
 db = SQLAlchemy()
 
+# Ratings are multiples of 0.5 between 0 and 5, one histogram bucket per half star
+RATING_BUCKETS = 11
+
+
+def rating_bucket(rating):
+    return min(max(int(round(rating * 2)), 0), RATING_BUCKETS - 1)
+
+
+def rating_bucket_key(bucket):
+    """Name of the Book column counting the ratings in ``bucket``."""
+    return f'rating_bucket_{bucket}'
+
+
+def insert_ignoring_conflicts(connection, model):
+    """INSERT ... ON CONFLICT DO NOTHING into ``model``'s table for the connection's backend."""
+    insert_for_dialect = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    return insert_for_dialect(model).on_conflict_do_nothing()
+
 user_book = db.Table('user_book',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('book_id', db.Integer, db.ForeignKey('books.id'), primary_key=True)
 )
 
 followers = db.Table('followers',
-    db.Column('follower_id', db.Integer, db.ForeignKey('users.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('users.id'))
+    db.Column('follower_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Column('followed_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    # The primary key serves "whom does X follow", this one "who follows X"
+    db.Index('ix_followers_followed_id_follower_id', 'followed_id', 'follower_id')
 )
 
 class UserBook(db.Model):
@@ -26,6 +50,11 @@ class UserBook(db.Model):
     user = db.relationship("User", back_populates="user_books")
     book = db.relationship("Book", back_populates="user_books")
 
+    # A user's books by read date, covering the book_id needed for joins
+    __table_args__ = (
+        db.Index('ix_user_books_user_id_read_date', 'user_id', 'read_date', 'book_id'),
+    )
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
@@ -40,9 +69,13 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.Text)
     location = db.Column(db.String(100))
     website = db.Column(db.String(200))
-    profile_image = db.Column(db.LargeBinary)
+    # Legacy blob, new uploads go to the image store and only keep their hash here
+    profile_image = db.deferred(db.Column(db.LargeBinary))
+    profile_image_hash = db.Column(db.String(64))
     date_joined = db.Column(db.DateTime, default=db.func.now())
     preferred_language = db.Column(db.String(5))
+    # Kept by timeline.follow/unfollow, decides between fan-out on write and pull on read
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     followed = db.relationship('User', secondary=followers,
                                primaryjoin=(followers.c.follower_id == id),
@@ -86,10 +119,61 @@ class Book(db.Model):
 
     is_main_work = db.Column(db.Boolean, default=False)
 
-    @property
+    __table_args__ = (
+        db.Index('ix_books_author_id_is_main_work', 'author_id', 'is_main_work'),
+    )
+
+    # Denormalized rating aggregates, maintained by record_rating_change
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # One counter per half star, see rating_bucket
+    rating_bucket_0 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_6 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_7 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_8 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_9 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_bucket_10 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    @hybrid_property
     def average_rating(self):
-        ratings = [ub.rating for ub in self.user_books if ub.rating is not None]
-        return sum(ratings) / len(ratings) if ratings else None
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @average_rating.expression
+    def average_rating(cls):
+        return case((cls.rating_count > 0, cls.rating_sum / cls.rating_count), else_=None)
+
+    @property
+    def rating_histogram(self):
+        return [getattr(self, rating_bucket_key(bucket)) for bucket in range(RATING_BUCKETS)]
+
+    @rating_histogram.setter
+    def rating_histogram(self, histogram):
+        for bucket, count in enumerate(histogram):
+            setattr(self, rating_bucket_key(bucket), count)
+
+    def record_rating_change(self, old_rating, new_rating):
+        """Apply one user's rating change to the aggregates, in the same transaction as the UserBook write.
+
+        The counters are incremented in SQL so concurrent ratings of the same book don't
+        overwrite each other, changes made before the next flush are added up.
+        """
+        # Deltas assigned since the last flush; a flush or rollback resets the attribute history
+        pending = getattr(self, '_pending_rating_deltas', None)
+        if pending is None or not inspect(self).attrs.rating_count.history.has_changes():
+            pending = self._pending_rating_deltas = {}
+        for rating, delta in ((old_rating, -1), (new_rating, 1)):
+            if rating is None:
+                continue
+            for key, amount in (('rating_count', delta), ('rating_sum', delta * rating),
+                                (rating_bucket_key(rating_bucket(rating)), delta)):
+                pending[key] = pending.get(key, 0) + amount
+        for key, amount in pending.items():
+            setattr(self, key, getattr(Book, key) + amount)
 
     def __str__(self):
         return f"{self.title} by {self.author}"
@@ -115,6 +199,8 @@ class List(db.Model):
     description_id = db.Column(db.Integer, db.ForeignKey('translation.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     is_public = db.Column(db.Boolean, default=False)
+    # Bumped whenever books are added, removed or reordered, keys the list page cache
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     name = db.relationship('Translation', foreign_keys=[name_id])
     description = db.relationship('Translation', foreign_keys=[description_id])
@@ -133,9 +219,56 @@ class BookList(db.Model):
     book = db.relationship("Book", backref="book", viewonly=True)
     list = db.relationship("List", backref="list", viewonly=True)
 
+    # The primary key starts with book_id, lists are read in rank order
+    __table_args__ = (
+        db.Index('ix_book_list_list_id_rank', 'list_id', 'rank', 'book_id'),
+    )
+
     def __str__(self):
         return f"BookList: {self.book.title} - {self.list.name}"
 
+class UserAuthorProgress(db.Model):
+    __tablename__ = 'user_author_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('authors.id'), primary_key=True, index=True)
+    read_books = db.Column(db.Integer, nullable=False, default=0)
+    read_main_works = db.Column(db.Integer, nullable=False, default=0)
+    total_books = db.Column(db.Integer, nullable=False, default=0)
+    total_main_works = db.Column(db.Integer, nullable=False, default=0)
+
+    author = db.relationship('Author')
+
+    @property
+    def read_percentage(self):
+        return (self.read_books / self.total_books * 100) if self.total_books > 0 else 0
+
+    @property
+    def main_works_read_percentage(self):
+        return (self.read_main_works / self.total_main_works * 100) if self.total_main_works > 0 else 0
+
+    def __str__(self):
+        return f"UserAuthorProgress: {self.user_id} - {self.author_id} ({self.read_books}/{self.total_books})"
+
+class UserListProgress(db.Model):
+    __tablename__ = 'user_list_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    list_id = db.Column(db.Integer, db.ForeignKey('lists.id'), primary_key=True, index=True)
+    read_books = db.Column(db.Integer, nullable=False, default=0)
+    read_main_works = db.Column(db.Integer, nullable=False, default=0)
+    total_books = db.Column(db.Integer, nullable=False, default=0)
+    total_main_works = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def read_percentage(self):
+        return (self.read_books / self.total_books * 100) if self.total_books > 0 else 0
+
+    @property
+    def main_works_read_percentage(self):
+        return (self.read_main_works / self.total_main_works * 100) if self.total_main_works > 0 else 0
+
+    def __str__(self):
+        return f"UserListProgress: {self.user_id} - {self.list_id} ({self.read_books}/{self.total_books})"
+
 class ReadingGoal(db.Model):
     __tablename__ = 'reading_goals'
     id = db.Column(db.Integer, primary_key=True)
@@ -144,11 +277,79 @@ class ReadingGoal(db.Model):
     target = db.Column(db.Integer, nullable=False)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
+    # Reads and their pages inside the goal window, maintained by reading_goals.py
+    books_read = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    pages_read = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped with every change to the goal or its counters, keys the progress ETag
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     user = db.relationship('User', back_populates='reading_goal')
 
     def __str__(self):
         return f"ReadingGoal: {self.user.username} - {self.goal_type} ({self.target})"
 
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # 'pending', 'running', 'done' or 'failed'
+    filename = db.Column(db.String(255))
+    mappings = db.Column(db.Text, nullable=False)
+    locale = db.Column(db.String(5))
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    imported_rows = db.Column(db.Integer, nullable=False, default=0)
+    unmatched_rows = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    user = db.relationship('User')
+
+    @property
+    def progress(self):
+        if not self.total_rows:
+            return 100 if self.status == 'done' else 0
+        return round(self.processed_rows / self.total_rows * 100, 1)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'imported_rows': self.imported_rows,
+            'unmatched_rows': self.unmatched_rows,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __str__(self):
+        return f"ImportJob: {self.user.username} - {self.filename} ({self.status})"
+
+class EnrichmentJob(db.Model):
+    __tablename__ = 'enrichment_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'book' or 'author'
+    target_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # 'pending', 'running', 'done' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    # One job per book or author, enqueueing again is a no-op
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'target_id', name='uq_enrichment_jobs_kind_target_id'),
+    )
+
+    def __str__(self):
+        return f"EnrichmentJob: {self.kind} {self.target_id} ({self.status})"
+
 class Post(db.Model):
     __tablename__ = 'posts'
     id = db.Column(db.Integer, primary_key=True)
@@ -159,23 +360,58 @@ class Post(db.Model):
     def __str__(self):
         return f"Post: {self.author.username} - {self.timestamp}"
 
-    def get_body(self, lang='en'):
+    def get_body(self, lang=None):
         if self.body:
             try:
                 body_dict = json.loads(self.body)
+                lang = lang or current_language()
                 return body_dict.get(lang, body_dict.get('en', ''))
             except json.JSONDecodeError:
                 return self.body
         return ''
 
+class Activity(db.Model):
+    __tablename__ = 'activities'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    type = db.Column(db.String(20), nullable=False)  # 'book_read', 'list_created' or 'post_created'
+    # Deleting the book, list or post deletes its activities (and their timeline entries)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'))
+    list_id = db.Column(db.Integer, db.ForeignKey('lists.id', ondelete='CASCADE'))
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'))
+    occurred_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    user = db.relationship('User')
+    book = db.relationship('Book')
+    list = db.relationship('List')
+    post = db.relationship('Post')
+
+    # A user's feed newest first, the id breaks ties for cursor pagination
+    __table_args__ = (
+        db.Index('ix_activities_user_id_occurred_at', 'user_id', 'occurred_at', 'id'),
+    )
+
+    def __str__(self):
+        return f"Activity: {self.user.username} - {self.type} ({self.occurred_at})"
+
+class TimelineEntry(db.Model):
+    __tablename__ = 'timeline_entries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id', ondelete='CASCADE'), primary_key=True)
+    # Copied from the activity so the inbox is read in order from the index alone
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    activity = db.relationship('Activity')
+
+    __table_args__ = (
+        db.Index('ix_timeline_entries_user_id_occurred_at', 'user_id', 'occurred_at', 'activity_id'),
+    )
+
 class Translation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text_de = db.Column(db.Text, nullable=False)
     text_en = db.Column(db.Text, nullable=False)
 
     def __str__(self):
-        locale = str(get_locale())
-        if locale == 'de':
+        if current_language() == 'de':
             return self.text_de
         else:
             return self.text_en
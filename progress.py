@@ -0,0 +1,308 @@
+from sqlalchemy import event, select, insert, update, delete, func, case, and_, inspect
+from sqlalchemy.orm import Session
+from models import db, insert_ignoring_conflicts, Book, UserBook, BookList, List, UserAuthorProgress, UserListProgress
+
+# user_author_progress keeps, per (user, author), how many of the author's books
+# and main works exist and how many of them the user has read. Read-status
+# changes and new books are applied as deltas; book deletes and main-work
+# changes re-derive the rows of the affected authors from the base tables.
+#
+# user_list_progress holds the same counters per (user, list). Rows are created
+# the first time a user looks at a list and afterwards kept current: read-status
+# and BookList membership changes are applied as deltas, anything else that
+# touches a list re-derives its rows.
+
+
+def _count_main_works(column):
+    return func.count(case((Book.is_main_work == True, column)))
+
+
+def _refresh_author_progress(connection, author_ids=None, user_ids=None):
+    """Re-derive progress rows from books/user_books, optionally limited to some authors/users."""
+    stale_rows = delete(UserAuthorProgress)
+    totals = select(
+        Book.author_id,
+        func.count(Book.id).label('total_books'),
+        _count_main_works(Book.id).label('total_main_works')
+    ).group_by(Book.author_id)
+    reads = select(
+        UserBook.user_id,
+        Book.author_id,
+        func.count(Book.id).label('read_books'),
+        _count_main_works(Book.id).label('read_main_works')
+    ).join(Book, Book.id == UserBook.book_id)\
+     .where(UserBook.read_date.isnot(None))\
+     .group_by(UserBook.user_id, Book.author_id)
+
+    if author_ids is not None:
+        stale_rows = stale_rows.where(UserAuthorProgress.author_id.in_(author_ids))
+        totals = totals.where(Book.author_id.in_(author_ids))
+        reads = reads.where(Book.author_id.in_(author_ids))
+    if user_ids is not None:
+        stale_rows = stale_rows.where(UserAuthorProgress.user_id.in_(user_ids))
+        reads = reads.where(UserBook.user_id.in_(user_ids))
+
+    totals = totals.subquery()
+    reads = reads.subquery()
+    connection.execute(stale_rows)
+    connection.execute(insert(UserAuthorProgress).from_select(
+        ['user_id', 'author_id', 'read_books', 'read_main_works', 'total_books', 'total_main_works'],
+        select(reads.c.user_id, reads.c.author_id, reads.c.read_books, reads.c.read_main_works,
+               totals.c.total_books, totals.c.total_main_works)
+        .join(totals, totals.c.author_id == reads.c.author_id)
+    ))
+
+
+def rebuild_author_progress():
+    """Repair the whole user_author_progress table from the base tables."""
+    _refresh_author_progress(db.session.connection())
+    db.session.commit()
+
+
+def get_author_progress_stats(user_id, author_id):
+    """Return reading statistics for one author in the shape of ``utils.resolve_read_status``."""
+    progress = db.session.get(UserAuthorProgress, (user_id, author_id))
+    if progress is None:
+        # The user has not read anything by this author yet, only the totals are needed
+        total_books, total_main_works = db.session.query(
+            func.count(Book.id), _count_main_works(Book.id)
+        ).filter(Book.author_id == author_id).one()
+        progress = UserAuthorProgress(user_id=user_id, author_id=author_id,
+                                      read_books=0, read_main_works=0,
+                                      total_books=total_books, total_main_works=total_main_works)
+    return {
+        'total_books': progress.total_books,
+        'read_books': progress.read_books,
+        'read_percentage': progress.read_percentage,
+        'total_main_works': progress.total_main_works,
+        'read_main_works': progress.read_main_works,
+        'read_main_works_percentage': progress.main_works_read_percentage
+    }
+
+
+def _list_progress_values(user_id, list_id):
+    """Counter expressions for one (user, list), usable as literals or correlated to user_list_progress."""
+    in_list = BookList.list_id == list_id
+    read_by_user = and_(UserBook.book_id == BookList.book_id,
+                        UserBook.user_id == user_id,
+                        UserBook.read_date.isnot(None))
+    count = select(func.count(BookList.book_id))
+    return {
+        'total_books': count.where(in_list).scalar_subquery(),
+        'total_main_works': count.join(Book, Book.id == BookList.book_id)
+            .where(in_list, Book.is_main_work == True).scalar_subquery(),
+        'read_books': count.join(UserBook, read_by_user).where(in_list).scalar_subquery(),
+        'read_main_works': count.join(UserBook, read_by_user).join(Book, Book.id == BookList.book_id)
+            .where(in_list, Book.is_main_work == True).scalar_subquery()
+    }
+
+
+def _refresh_list_progress(connection, list_ids=None):
+    """Re-derive existing user_list_progress rows from book_list/user_books."""
+    stmt = update(UserListProgress).values(
+        **_list_progress_values(UserListProgress.user_id, UserListProgress.list_id))
+    if list_ids is not None:
+        stmt = stmt.where(UserListProgress.list_id.in_(list_ids))
+    connection.execute(stmt)
+
+
+def rebuild_list_progress():
+    """Repair every user_list_progress row from the base tables."""
+    _refresh_list_progress(db.session.connection())
+    db.session.commit()
+
+
+def get_list_progress_stats(user_id, list_id):
+    """Return reading statistics for one list in the shape of ``utils.resolve_read_status``.
+
+    A missing row is created in its own transaction, so this never commits the
+    request's session. Call it before the request writes anything, on SQLite the
+    insert would otherwise wait for the session's write lock.
+    """
+    progress = db.session.get(UserListProgress, (user_id, list_id))
+    if progress is None:
+        # Concurrent first views insert the same row, all but one are ignored
+        with db.engine.begin() as connection:
+            connection.execute(insert_ignoring_conflicts(connection, UserListProgress)
+                               .values(user_id=user_id, list_id=list_id, **_list_progress_values(user_id, list_id)))
+            row = connection.execute(select(UserListProgress.__table__)
+                                     .where(UserListProgress.user_id == user_id,
+                                            UserListProgress.list_id == list_id)).one()
+        progress = UserListProgress(**row._mapping)
+    return {
+        'total_books': progress.total_books,
+        'read_books': progress.read_books,
+        'read_percentage': progress.read_percentage,
+        'total_main_works': progress.total_main_works,
+        'read_main_works': progress.read_main_works,
+        'read_main_works_percentage': progress.main_works_read_percentage
+    }
+
+
+def _committed_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _current_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.added:
+        return history.added[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _collection_changed(obj, key):
+    return inspect(obj).attrs[key].history.has_changes()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_progress_changes(session, flush_context):
+    read_deltas = {}
+    membership_deltas = {}
+    # author_id -> (books, main works) added to the author's totals
+    author_total_deltas = {}
+    refresh_authors = set()
+    refresh_lists = set()
+    deleted_lists = set()
+
+    for obj in session.new:
+        if isinstance(obj, UserBook) and obj.read_date is not None:
+            read_deltas[(obj.user_id, obj.book_id)] = 1
+        elif isinstance(obj, Book):
+            books, main_works = author_total_deltas.get(obj.author_id, (0, 0))
+            author_total_deltas[obj.author_id] = (books + 1, main_works + (1 if obj.is_main_work else 0))
+            refresh_lists.update(book_list.id for book_list in obj.lists)
+        elif isinstance(obj, BookList):
+            membership_deltas[(obj.list_id, obj.book_id)] = 1
+
+    for obj in session.deleted:
+        if isinstance(obj, UserBook) and _committed_value(obj, 'read_date') is not None:
+            read_deltas[(obj.user_id, obj.book_id)] = -1
+        elif isinstance(obj, Book):
+            refresh_authors.add(_committed_value(obj, 'author_id'))
+            # The flush loaded book.lists to delete the book's book_list rows
+            refresh_lists.update(book_list.id for book_list in obj.lists)
+        elif isinstance(obj, BookList):
+            membership_deltas[(obj.list_id, obj.book_id)] = -1
+        elif isinstance(obj, List):
+            deleted_lists.add(obj.id)
+
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, UserBook):
+            was_read = _committed_value(obj, 'read_date') is not None
+            is_read = _current_value(obj, 'read_date') is not None
+            if was_read != is_read:
+                read_deltas[(obj.user_id, obj.book_id)] = 1 if is_read else -1
+        elif isinstance(obj, Book):
+            state = inspect(obj).attrs
+            if state.is_main_work.history.has_changes() or state.author_id.history.has_changes():
+                refresh_authors.add(_committed_value(obj, 'author_id'))
+                refresh_authors.add(_current_value(obj, 'author_id'))
+                refresh_lists.update(book_list.id for book_list in obj.lists)
+            if _collection_changed(obj, 'lists'):
+                history = state.lists.history
+                refresh_lists.update(book_list.id for book_list in history.added + history.deleted)
+        elif isinstance(obj, List) and _collection_changed(obj, 'books'):
+            refresh_lists.add(obj.id)
+
+    refresh_authors.discard(None)
+    author_total_deltas.pop(None, None)
+    if not (read_deltas or membership_deltas or author_total_deltas or refresh_authors
+            or refresh_lists or deleted_lists):
+        return
+
+    connection = session.connection()
+    if refresh_authors:
+        _refresh_author_progress(connection, author_ids=list(refresh_authors))
+    for author_id, (books, main_works) in author_total_deltas.items():
+        if author_id not in refresh_authors:
+            connection.execute(
+                update(UserAuthorProgress)
+                .where(UserAuthorProgress.author_id == author_id)
+                .values(total_books=UserAuthorProgress.total_books + books,
+                        total_main_works=UserAuthorProgress.total_main_works + main_works)
+            )
+    if deleted_lists:
+        connection.execute(delete(UserListProgress).where(UserListProgress.list_id.in_(deleted_lists)))
+    if refresh_lists:
+        _refresh_list_progress(connection, list_ids=list(refresh_lists))
+    skip_lists = refresh_lists | deleted_lists
+
+    _apply_membership_deltas(connection, membership_deltas, skip_lists)
+    if read_deltas:
+        _apply_read_deltas(connection, read_deltas, refresh_authors, skip_lists, membership_deltas)
+
+
+def _apply_membership_deltas(connection, membership_deltas, skip_lists):
+    for (list_id, book_id), delta in membership_deltas.items():
+        if list_id in skip_lists:
+            continue
+        is_main_work = select(func.count(Book.id)).where(
+            Book.id == book_id, Book.is_main_work == True).scalar_subquery()
+        # 1 if the row's user has read the book, 0 otherwise (user_books is keyed by user and book)
+        read_by_user = select(func.count(UserBook.book_id)).where(
+            UserBook.user_id == UserListProgress.user_id,
+            UserBook.book_id == book_id,
+            UserBook.read_date.isnot(None)).scalar_subquery()
+        connection.execute(
+            update(UserListProgress)
+            .where(UserListProgress.list_id == list_id)
+            .values(total_books=UserListProgress.total_books + delta,
+                    total_main_works=UserListProgress.total_main_works + delta * is_main_work,
+                    read_books=UserListProgress.read_books + delta * read_by_user,
+                    read_main_works=UserListProgress.read_main_works + delta * read_by_user * is_main_work)
+        )
+
+
+def _apply_read_deltas(connection, read_deltas, refresh_authors, skip_lists, membership_deltas):
+    book_ids = {book_id for _, book_id in read_deltas}
+    books = {
+        book_id: (author_id, is_main_work)
+        for book_id, author_id, is_main_work in connection.execute(
+            select(Book.id, Book.author_id, Book.is_main_work).where(Book.id.in_(book_ids)))
+    }
+
+    author_deltas = {}
+    for (user_id, book_id), delta in read_deltas.items():
+        if book_id not in books:
+            continue
+        author_id, is_main_work = books[book_id]
+        main_delta = delta if is_main_work else 0
+
+        # Lists whose membership of this book changed in the same flush already counted it
+        changed_lists = skip_lists | {list_id for list_id, changed_book_id in membership_deltas
+                                      if changed_book_id == book_id}
+        list_filter = UserListProgress.list_id.in_(
+            select(BookList.list_id).where(BookList.book_id == book_id))
+        if changed_lists:
+            list_filter = and_(list_filter, UserListProgress.list_id.notin_(changed_lists))
+        connection.execute(
+            update(UserListProgress)
+            .where(UserListProgress.user_id == user_id, list_filter)
+            .values(read_books=UserListProgress.read_books + delta,
+                    read_main_works=UserListProgress.read_main_works + main_delta)
+        )
+
+        if author_id in refresh_authors:
+            continue
+        read, read_main = author_deltas.get((user_id, author_id), (0, 0))
+        author_deltas[(user_id, author_id)] = (read + delta, read_main + main_delta)
+
+    for (user_id, author_id), (read, read_main) in author_deltas.items():
+        result = connection.execute(
+            update(UserAuthorProgress)
+            .where(UserAuthorProgress.user_id == user_id, UserAuthorProgress.author_id == author_id)
+            .values(read_books=UserAuthorProgress.read_books + read,
+                    read_main_works=UserAuthorProgress.read_main_works + read_main)
+        )
+        if result.rowcount == 0:
+            # First book read by this author, the base tables already include the change
+            _refresh_author_progress(connection, author_ids=[author_id], user_ids=[user_id])
@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import accumulate
+from sqlalchemy import event, select, update, func, and_, literal, true, inspect
+from sqlalchemy.orm import Session
+from models import db, Book, ReadingGoal, UserBook
+
+# reading_goals.books_read/pages_read count the user's reads whose read_date falls
+# inside the goal window, so goal progress is one row lookup instead of a COUNT or
+# SUM(page_count) over the user's whole reading history on every poll.
+#
+# Read-date changes are applied as deltas to the goal whose window contains the
+# old or new date, page_count enrichment adjusts pages_read of every goal that
+# counts the book, and a new goal or an edited window re-derives its counters.
+# Every change bumps reading_goals.version, which keys the progress ETag and the
+# cached goal history.
+
+GOAL_HISTORY_INTERVALS = {'day': 1, 'week': 7}
+# Longest goal window set_goal accepts, which also bounds the history's buckets
+GOAL_MAX_DAYS = 10 * 366
+GOAL_HISTORY_CACHE_SIZE = 256
+
+_histories = OrderedDict()
+
+
+def _counted_reads(goal):
+    """Reads inside the window of ``goal`` (a ReadingGoal row or the correlated table)."""
+    return and_(UserBook.user_id == goal.user_id,
+                UserBook.read_date.isnot(None),
+                UserBook.read_date >= goal.start_date,
+                UserBook.read_date <= goal.end_date)
+
+
+def _progress_values():
+    return {
+        'books_read': select(func.count(UserBook.book_id))
+            .where(_counted_reads(ReadingGoal)).scalar_subquery(),
+        'pages_read': select(func.coalesce(func.sum(Book.page_count), 0))
+            .select_from(UserBook).join(Book, Book.id == UserBook.book_id)
+            .where(_counted_reads(ReadingGoal)).scalar_subquery(),
+        'version': ReadingGoal.version + 1,
+    }
+
+
+def _refresh_goal_progress(connection, goal_ids=None):
+    """Re-derive the counters of some goals (all of them by default) from user_books."""
+    stmt = update(ReadingGoal).values(**_progress_values())
+    if goal_ids is not None:
+        stmt = stmt.where(ReadingGoal.id.in_(goal_ids))
+    connection.execute(stmt)
+
+
+def rebuild_goal_progress():
+    """Repair every reading goal's counters from the base tables."""
+    _refresh_goal_progress(db.session.connection())
+    db.session.commit()
+
+
+def build_goal_history(goal, interval, today):
+    """Cumulative books and pages read per ``interval`` across the goal window, with the expected pace.
+
+    Buckets after ``today`` only carry the expected value. Histories are cached
+    per goal version, so only the first request after a change queries. Raises
+    ValueError for a window that ends before it starts or exceeds GOAL_MAX_DAYS.
+    """
+    key = (goal.id, goal.version, interval, today)
+    history = _histories.get(key)
+    if history is not None:
+        _histories.move_to_end(key)
+        return history
+
+    step = GOAL_HISTORY_INTERVALS[interval]
+    total_days = (goal.end_date - goal.start_date).days + 1
+    if not 0 < total_days <= GOAL_MAX_DAYS:
+        raise ValueError('Reading goal window is out of range')
+    bucket_count = -(-total_days // step)
+    books = [0] * bucket_count
+    pages = [0] * bucket_count
+    reads_per_day = db.session.query(UserBook.read_date, func.count(UserBook.book_id),
+                                     func.coalesce(func.sum(Book.page_count), 0))\
+        .join(Book, Book.id == UserBook.book_id)\
+        .filter(_counted_reads(goal))\
+        .group_by(UserBook.read_date)
+    for read_date, book_count, page_count in reads_per_day:
+        bucket = (read_date - goal.start_date).days // step
+        books[bucket] += book_count
+        pages[bucket] += page_count
+
+    history = []
+    for bucket, (books_read, pages_read) in enumerate(zip(accumulate(books), accumulate(pages))):
+        start = goal.start_date + timedelta(days=bucket * step)
+        end = min(start + timedelta(days=step - 1), goal.end_date)
+        started = start <= today
+        history.append({
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'books_read': books_read if started else None,
+            'pages_read': pages_read if started else None,
+            'expected': round(goal.target * ((end - goal.start_date).days + 1) / total_days, 2),
+        })
+
+    _histories[key] = history
+    while len(_histories) > GOAL_HISTORY_CACHE_SIZE:
+        _histories.popitem(last=False)
+    return history
+
+
+def _committed_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _current_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.added:
+        return history.added[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _changed(obj, *keys):
+    attrs = inspect(obj).attrs
+    return any(attrs[key].history.has_changes() for key in keys)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_goal_changes(session, flush_context):
+    # (user_id, book_id, read_date, +1/-1)
+    read_changes = []
+    # book_id -> (old, new) page_count; deleted books keep their old count to subtract
+    page_changes = {}
+    refresh_goals = set()
+    bump_goals = set()
+
+    for obj in session.new:
+        if isinstance(obj, UserBook) and obj.read_date is not None:
+            read_changes.append((obj.user_id, obj.book_id, obj.read_date, 1))
+        elif isinstance(obj, ReadingGoal):
+            refresh_goals.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, UserBook) and _committed_value(obj, 'read_date') is not None:
+            read_changes.append((obj.user_id, obj.book_id, _committed_value(obj, 'read_date'), -1))
+        elif isinstance(obj, Book):
+            page_changes[obj.id] = (_committed_value(obj, 'page_count'), None)
+
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, UserBook) and _changed(obj, 'read_date'):
+            old_date, new_date = _committed_value(obj, 'read_date'), _current_value(obj, 'read_date')
+            if old_date is not None:
+                read_changes.append((obj.user_id, obj.book_id, old_date, -1))
+            if new_date is not None:
+                read_changes.append((obj.user_id, obj.book_id, new_date, 1))
+        elif isinstance(obj, Book) and _changed(obj, 'page_count'):
+            page_changes[obj.id] = (_committed_value(obj, 'page_count'), _current_value(obj, 'page_count'))
+        elif isinstance(obj, ReadingGoal):
+            if _changed(obj, 'start_date', 'end_date', 'user_id'):
+                refresh_goals.add(obj.id)
+            elif _changed(obj, 'goal_type', 'target'):
+                bump_goals.add(obj.id)
+
+    if not (read_changes or page_changes or refresh_goals or bump_goals):
+        return
+
+    connection = session.connection()
+    if refresh_goals:
+        _refresh_goal_progress(connection, goal_ids=list(refresh_goals))
+    if bump_goals - refresh_goals:
+        connection.execute(update(ReadingGoal)
+                           .where(ReadingGoal.id.in_(bump_goals - refresh_goals))
+                           .values(version=ReadingGoal.version + 1))
+
+    not_refreshed = ReadingGoal.id.notin_(refresh_goals) if refresh_goals else true()
+    for user_id, book_id, read_date, delta in read_changes:
+        if delta < 0 and book_id in page_changes:
+            # The read was counted with the page count from before this flush
+            pages = literal(page_changes[book_id][0] or 0)
+        else:
+            pages = func.coalesce(select(Book.page_count).where(Book.id == book_id).scalar_subquery(), 0)
+        connection.execute(
+            update(ReadingGoal)
+            .where(ReadingGoal.user_id == user_id,
+                   ReadingGoal.start_date <= read_date,
+                   ReadingGoal.end_date >= read_date,
+                   not_refreshed)
+            .values(books_read=ReadingGoal.books_read + delta,
+                    pages_read=ReadingGoal.pages_read + delta * pages,
+                    version=ReadingGoal.version + 1)
+        )
+
+    for book_id, (old_pages, new_pages) in page_changes.items():
+        page_delta = (new_pages or 0) - (old_pages or 0)
+        if not page_delta:
+            continue
+        # Reads changed in this flush were already counted with the new page count
+        changed_users = {user_id for user_id, changed_book_id, *_ in read_changes if changed_book_id == book_id}
+        counts_book = select(UserBook.book_id).where(_counted_reads(ReadingGoal), UserBook.book_id == book_id)
+        stmt = update(ReadingGoal)\
+            .where(counts_book.exists(), not_refreshed)\
+            .values(pages_read=ReadingGoal.pages_read + page_delta,
+                    version=ReadingGoal.version + 1)
+        if changed_users:
+            stmt = stmt.where(ReadingGoal.user_id.notin_(changed_users))
+        connection.execute(stmt)
@@ -0,0 +1,15 @@
+from app import app
+from models import UserAuthorProgress, UserListProgress, ReadingGoal
+from progress import rebuild_author_progress, rebuild_list_progress
+from reading_goals import rebuild_goal_progress
+
+# Repairs user_author_progress, user_list_progress and the reading goal counters
+# from the base tables. Run it after bulk imports or raw SQL edits that bypass
+# the ORM flush listeners.
+with app.app_context():
+    rebuild_author_progress()
+    print(f"Rebuilt author progress: {UserAuthorProgress.query.count()} rows")
+    rebuild_list_progress()
+    print(f"Rebuilt list progress: {UserListProgress.query.count()} rows")
+    rebuild_goal_progress()
+    print(f"Rebuilt reading goal progress: {ReadingGoal.query.count()} goals")
@@ -0,0 +1,30 @@
+from app import app
+from models import db, Book, UserBook, RATING_BUCKETS, rating_bucket
+
+
+def reconcile_rating_aggregates():
+    """Recompute Book.rating_count/rating_sum and the histogram counters from user_books and fix any drift."""
+    aggregates = {}
+    ratings = db.session.query(UserBook.book_id, UserBook.rating).filter(UserBook.rating.isnot(None))
+    for book_id, rating in ratings:
+        count, total, histogram = aggregates.get(book_id, (0, 0.0, [0] * RATING_BUCKETS))
+        histogram[rating_bucket(rating)] += 1
+        aggregates[book_id] = (count + 1, total + rating, histogram)
+
+    fixed = 0
+    for book in Book.query.filter((Book.rating_count != 0) | Book.id.in_(list(aggregates))):
+        count, total, histogram = aggregates.get(book.id, (0, 0.0, [0] * RATING_BUCKETS))
+        if (book.rating_count, book.rating_sum, book.rating_histogram) != (count, total, histogram):
+            book.rating_count = count
+            book.rating_sum = total
+            book.rating_histogram = histogram
+            fixed += 1
+
+    db.session.commit()
+    return fixed
+
+
+if __name__ == "__main__":
+    with app.app_context():
+        fixed = reconcile_rating_aggregates()
+        print(f"Rating aggregates reconciled: {fixed} books updated")
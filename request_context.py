@@ -0,0 +1,46 @@
+import flask_babel
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_login import current_user
+
+# The locale of a request is resolved once and kept on ``g`` as a plain language
+# code. Translation.__str__ runs for every title and name a template renders, so
+# it reads the cached code instead of going through Babel (and the user and
+# session lookups of the selector) each time.
+#
+# g.locale_resolutions counts how often the selector itself ran and
+# g.locale_lookups how often the language was read; with REQUEST_COUNTERS_HEADER
+# both are sent back as X-Locale-Resolutions / X-Locale-Lookups.
+
+
+def resolve_locale():
+    """Babel's locale selector, only called once per request."""
+    g.locale_resolutions = g.get('locale_resolutions', 0) + 1
+
+    # 1. Check if user is logged in and has a preferred language
+    if current_user.is_authenticated and hasattr(current_user, 'preferred_language'):
+        return current_user.preferred_language
+
+    # 2. Check for language in session
+    if 'language' in session:
+        return session['language']
+
+    # 3. Try to guess the language from the user accept header the browser transmits
+    return request.accept_languages.best_match(current_app.config['LANGUAGES'])
+
+
+def current_language():
+    """Language code of the current request, the default locale outside of one."""
+    if not has_request_context():
+        return current_app.config['BABEL_DEFAULT_LOCALE'] if has_app_context() else 'en'
+    g.locale_lookups = g.get('locale_lookups', 0) + 1
+    language = g.get('language')
+    if language is None:
+        language = g.language = str(flask_babel.get_locale())
+    return language
+
+
+def add_counter_headers(response):
+    if current_app.config.get('REQUEST_COUNTERS_HEADER'):
+        response.headers['X-Locale-Resolutions'] = str(g.get('locale_resolutions', 0))
+        response.headers['X-Locale-Lookups'] = str(g.get('locale_lookups', 0))
+    return response
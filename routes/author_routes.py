@@ -1,59 +1,61 @@
 from flask import Blueprint, render_template, request, jsonify
-from models import db, Author, Book, Translation, UserBook
+from models import db, Author, Book, Translation, UserBook, UserAuthorProgress
 from sqlalchemy.orm import joinedload
 from flask_login import login_required, current_user
-from flask_babel import _, get_locale
-from sqlalchemy import func, case, desc
+from flask_babel import _
+from request_context import current_language
+from sqlalchemy import func, case, desc, select
 from datetime import date
+from utils import get_read_book_ids
+from progress import get_author_progress_stats
+from search import search_ids, AUTHOR_NAME
+from keyset import paginate
+from count_cache import estimate_search_totals
 
 bp = Blueprint('author', __name__)
 
+MAX_PER_PAGE = 100
+
 @bp.route('/authors')
 @login_required
 def authors():
-    page = request.args.get('page', 1, type=int)
-    per_page = 12  # Number of authors per page
+    per_page = request.args.get('per_page', 12, type=int)  # Number of authors per page
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
     search_query = request.args.get('search', '')
     sort_by = request.args.get('sort', 'name')  # Default sort by name
 
-    query = db.session.query(Author, Translation, func.count(Book.id).label('book_count'))\
-        .join(Translation, Author.name_id == Translation.id)\
-        .outerjoin(Book, Author.id == Book.author_id)\
-        .group_by(Author.id, Translation.id)
+    # Book count and main-work count in one grouped query, read counts from the progress table
+    read_count = func.coalesce(func.max(UserAuthorProgress.read_books), 0)
+    query = db.session.query(
+        Author,
+        Translation,
+        func.count(Book.id).label('book_count'),
+        read_count.label('read_count'),
+        func.count(case((Book.is_main_work == True, 1))).label('main_work_count'),
+        func.coalesce(func.max(UserAuthorProgress.read_main_works), 0).label('read_main_work_count')
+    ).join(Translation, Author.name_id == Translation.id)\
+     .outerjoin(Book, Author.id == Book.author_id)\
+     .outerjoin(UserAuthorProgress, (UserAuthorProgress.author_id == Author.id) & (UserAuthorProgress.user_id == current_user.id))\
+     .group_by(Author.id, Translation.id)
 
     if search_query:
-        query = query.filter(Translation.text_en.ilike(f'%{search_query}%') | Translation.text_de.ilike(f'%{search_query}%'))
+        matches = search_ids(AUTHOR_NAME, search_query)
+        query = query.filter(Author.id.in_(select(matches.c.id)))
 
-    # Apply sorting
-    if sort_by == 'name':
-        query = query.order_by(Translation.text_en)
-    elif sort_by == 'books_count':
-        query = query.order_by(desc('book_count'))
+    # Apply sorting, Author.id keeps the order stable for cursors
+    if sort_by == 'books_count':
+        order_by = [desc(func.count(Book.id)), Author.id]
     elif sort_by == 'read_percentage':
-        subquery = db.session.query(
-            Book.author_id,
-            (func.sum(case((UserBook.read_date.isnot(None), 1), else_=0)) * 100 / func.count(Book.id)).label('read_percentage')
-        ).join(UserBook, (UserBook.book_id == Book.id) & (UserBook.user_id == current_user.id), isouter=True)\
-         .group_by(Book.author_id).subquery()
-        
-        query = query.outerjoin(subquery, Author.id == subquery.c.author_id)\
-                     .order_by(desc(subquery.c.read_percentage))
-
-    paginated_authors = query.paginate(page=page, per_page=per_page, error_out=False)
-
-    # Calculate read progress for each author
-    for author, translation, book_count in paginated_authors.items:
-        total_books = book_count
-        read_books = UserBook.query.join(Book).filter(Book.author_id == author.id, 
-                                                      UserBook.user_id == current_user.id, 
-                                                      UserBook.read_date.isnot(None)).count()
-        author.read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
-
-        total_main_works = Book.query.filter_by(author_id=author.id, is_main_work=True).count()
-        read_main_works = UserBook.query.join(Book).filter(Book.author_id == author.id, 
-                                                           Book.is_main_work == True,
-                                                           UserBook.user_id == current_user.id, 
-                                                           UserBook.read_date.isnot(None)).count()
+        order_by = [desc(func.coalesce(read_count * 100.0 / func.nullif(func.count(Book.id), 0), -1)), Author.id]
+    else:
+        order_by = [func.coalesce(Translation.text_en, ''), Author.id]
+
+    paginated_authors = paginate(query, order_by, per_page, having=sort_by in ('books_count', 'read_percentage'),
+                                 estimate=estimate_search_totals(search_query))
+
+    # Derive read progress for each author from the aggregated counts
+    for author, translation, book_count, read_books, total_main_works, read_main_works in paginated_authors.items:
+        author.read_percentage = (read_books / book_count * 100) if book_count > 0 else 0
         author.main_works_read_percentage = (read_main_works / total_main_works * 100) if total_main_works > 0 else 0
 
     return render_template('author/list.html',
@@ -67,27 +69,21 @@ def author_detail(id):
     author = Author.query.get_or_404(id)
     books = Book.query.filter_by(author_id=author.id).all()
     
-    # Calculate statistics for all books
-    total_books = len(books)
-    read_books = UserBook.query.filter(UserBook.book_id.in_([book.id for book in books]), 
-                                       UserBook.user_id == current_user.id, 
-                                       UserBook.read_date.isnot(None)).count()
-    read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
-    
-    # Calculate statistics for main works
-    main_works = [book for book in books if book.is_main_work]
-    total_main_works = len(main_works)
-    main_works_read = UserBook.query.filter(UserBook.book_id.in_([book.id for book in main_works]),
-                                            UserBook.user_id == current_user.id,
-                                            UserBook.read_date.isnot(None)).count()
-    main_works_read_percentage = (main_works_read / total_main_works * 100) if total_main_works > 0 else 0
+    # Statistics come from the maintained progress row, read flags from one batched lookup
+    stats = get_author_progress_stats(current_user.id, author.id)
+    read_ids = get_read_book_ids(current_user.id, [book.id for book in books])
+    total_books = stats['total_books']
+    read_books = stats['read_books']
+    read_percentage = stats['read_percentage']
+    total_main_works = stats['total_main_works']
+    main_works_read = stats['read_main_works']
+    main_works_read_percentage = stats['read_main_works_percentage']
     
     # Add is_read status to books
     for book in books:
-        user_book = UserBook.query.filter_by(user_id=current_user.id, book_id=book.id).first()
-        book.is_read = user_book.read_date is not None if user_book else False
+        book.is_read = book.id in read_ids
     
-    lang = str(get_locale())
+    lang = current_language()
     return render_template('author/detail.html', 
                            author=author, 
                            books=books, 
@@ -103,16 +99,20 @@ def author_detail(id):
 def api_authors():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
     search_query = request.args.get('search', '')
     
     query = Author.query.join(Translation, Author.name_id == Translation.id)
 
     if search_query:
-        query = query.filter(Translation.text_en.ilike(f'%{search_query}%') | Translation.text_de.ilike(f'%{search_query}%'))
+        matches = search_ids(AUTHOR_NAME, search_query)
+        query = query.filter(Author.id.in_(select(matches.c.id)))
 
-    authors = query.order_by(Translation.text_en).paginate(page=page, per_page=per_page, error_out=False)
+    # Page numbers by default, cursors when the client passes ?cursor=
+    authors = paginate(query, [func.coalesce(Translation.text_en, ''), Author.id], per_page,
+                       page=page, keyset='cursor' in request.args)
     
-    lang = str(get_locale())
+    lang = current_language()
     return jsonify({
         'authors': [{
             'id': author.id,
@@ -121,7 +121,9 @@ def api_authors():
         } for author in authors.items],
         'total': authors.total,
         'pages': authors.pages,
-        'current_page': authors.page
+        'current_page': authors.page,
+        'next_cursor': authors.next_cursor,
+        'prev_cursor': authors.prev_cursor
     })
 
 @bp.route('/toggle_read_status', methods=['POST'])
@@ -144,22 +146,13 @@ def toggle_read_status():
 
     db.session.commit()
 
-    # Recalculate statistics
-    author = Book.query.get(book_id).author
-    books = Book.query.filter_by(author_id=author.id).all()
-    total_books = len(books)
-    read_books = UserBook.query.filter(UserBook.book_id.in_([book.id for book in books]), 
-                                       UserBook.user_id == current_user.id, 
-                                       UserBook.read_date.isnot(None)).count()
-    read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
-
-    # Calculate statistics for main works
-    main_works = [book for book in books if book.is_main_work]
-    total_main_works = len(main_works)
-    main_works_read = UserBook.query.filter(UserBook.book_id.in_([book.id for book in main_works]),
-                                            UserBook.user_id == current_user.id,
-                                            UserBook.read_date.isnot(None)).count()
-    main_works_read_percentage = (main_works_read / total_main_works * 100) if total_main_works > 0 else 0
+    # Statistics are kept current by the progress table on flush
+    author_id = db.session.query(Book.author_id).filter(Book.id == book_id).scalar()
+    stats = get_author_progress_stats(current_user.id, author_id)
+    read_books = stats['read_books']
+    read_percentage = stats['read_percentage']
+    main_works_read = stats['read_main_works']
+    main_works_read_percentage = stats['read_main_works_percentage']
 
     return jsonify({
         'success': True,
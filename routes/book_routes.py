@@ -2,9 +2,10 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models import db, Book, UserBook, Author, List, BookList, Translation
 from sqlalchemy.orm import joinedload
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 from datetime import date
-from flask_babel import _, get_locale
+from flask_babel import _
+from keyset import paginate
 
 bp = Blueprint('book', __name__)
 
@@ -45,20 +46,25 @@ def rate_book():
     except ValueError:
         return jsonify({'success': False, 'error': _('Invalid rating value')}), 400
 
+    book = Book.query.get(book_id)
+    if not book:
+        return jsonify({'success': False, 'error': _('Book not found')}), 404
+
     user_book = UserBook.query.filter_by(user_id=current_user.id,
                                          book_id=book_id).first()
 
     if user_book:
+        book.record_rating_change(user_book.rating, rating)
         user_book.rating = rating
     else:
         user_book = UserBook(user_id=current_user.id,
                              book_id=book_id,
                              rating=rating)
         db.session.add(user_book)
+        book.record_rating_change(None, rating)
 
     db.session.commit()
 
-    book = Book.query.get(book_id)
     return jsonify({
         'success': True,
         'rating': rating,
@@ -77,9 +83,10 @@ def delete_rating():
     user_book = UserBook.query.filter_by(user_id=current_user.id, book_id=book_id).first()
 
     if user_book:
+        book = user_book.book
+        book.record_rating_change(user_book.rating, None)
         user_book.rating = None
         db.session.commit()
-        book = Book.query.get(book_id)
         return jsonify({
             'success': True,
             'message': _('Rating deleted successfully'),
@@ -126,12 +133,14 @@ def book_lists(book_id):
 
     query = db.session.query(List, Translation).join(BookList).filter(BookList.book_id == book_id).join(Translation, List.name_id == Translation.id)
 
-    if sort == 'name':
-        query = query.order_by(Translation.text_en.asc() if order == 'asc' else Translation.text_en.desc())
-    elif sort == 'visibility':
-        query = query.order_by(List.is_public.asc() if order == 'asc' else List.is_public.desc())
+    if sort == 'visibility':
+        sort_column = List.is_public
+    else:
+        sort_column = func.coalesce(Translation.text_en, '')
+    order_by = [sort_column.asc(), List.id.asc()] if order == 'asc' else [sort_column.desc(), List.id.desc()]
 
-    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Page numbers by default, cursors when the client passes ?cursor=
+    paginated = paginate(query, order_by, per_page, page=page, keyset='cursor' in request.args)
 
     lists = [{'id': l.id, 'name': t.text_en, 'is_public': l.is_public} for l, t in paginated.items]
 
@@ -139,7 +148,9 @@ def book_lists(book_id):
         'lists': lists,
         'current_page': paginated.page,
         'pages': paginated.pages,
-        'total': paginated.total
+        'total': paginated.total,
+        'next_cursor': paginated.next_cursor,
+        'prev_cursor': paginated.prev_cursor
     })
 
 @bp.route('/toggle_read_status', methods=['POST'])
@@ -162,6 +173,8 @@ def toggle_read_status():
         db.session.add(user_book)
     else:
         if user_book:
+            if user_book.rating is not None:
+                user_book.book.record_rating_change(user_book.rating, None)
             db.session.delete(user_book)
 
     db.session.commit()
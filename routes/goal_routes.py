@@ -1,8 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import db, ReadingGoal, UserBook, Book
+from models import db, ReadingGoal
 from datetime import datetime, date
-from sqlalchemy import func
+from reading_goals import build_goal_history, GOAL_HISTORY_INTERVALS, GOAL_MAX_DAYS
 
 bp = Blueprint('goal', __name__)
 
@@ -14,6 +14,9 @@ def set_goal():
         target = int(request.form.get('target'))
         start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
         end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+        if end_date < start_date or (end_date - start_date).days + 1 > GOAL_MAX_DAYS:
+            flash('The goal must end after it starts and span at most ten years.', 'error')
+            return render_template('goal/set_goal.html')
 
         if current_user.reading_goal:
             current_user.reading_goal.goal_type = goal_type
@@ -26,7 +29,7 @@ def set_goal():
 
         db.session.commit()
         flash('Reading goal set successfully!', 'success')
-        return redirect(url_for('index'))
+        return redirect(url_for('home.index'))
 
     return render_template('goal/set_goal.html')
 
@@ -45,26 +48,13 @@ def goal_progress():
 
     total_days = (goal.end_date - goal.start_date).days + 1
     days_passed = (today - goal.start_date).days + 1
-    
-    if goal.goal_type == 'books':
-        books_read = UserBook.query.filter(
-            UserBook.user_id == current_user.id,
-            UserBook.read_date >= goal.start_date,
-            UserBook.read_date <= today
-        ).count()
-        progress = (books_read / goal.target) * 100
-        expected_progress = (days_passed / total_days) * 100
-    else:  # pages
-        pages_read = db.session.query(func.sum(Book.page_count)).join(UserBook).filter(
-            UserBook.user_id == current_user.id,
-            UserBook.read_date.isnot(None),
-            UserBook.read_date >= goal.start_date,
-            UserBook.read_date <= today
-        ).scalar() or 0
-        progress = (pages_read / goal.target) * 100
-        expected_progress = (days_passed / total_days) * 100
 
-    return jsonify({
+    # Counters cover the whole window, the expected pace changes with the day
+    read = goal.books_read if goal.goal_type == 'books' else goal.pages_read
+    progress = (read / goal.target) * 100
+    expected_progress = (days_passed / total_days) * 100
+
+    response = jsonify({
         'goal_type': goal.goal_type,
         'target': goal.target,
         'progress': round(progress, 2),
@@ -72,3 +62,33 @@ def goal_progress():
         'start_date': goal.start_date.isoformat(),
         'end_date': goal.end_date.isoformat()
     })
+    response.set_etag(f'{goal.id}-{goal.version}-{today.isoformat()}')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route('/goal_history')
+@login_required
+def goal_history():
+    goal = current_user.reading_goal
+    if not goal:
+        return jsonify({'error': 'No reading goal set'}), 404
+    interval = request.args.get('interval', 'day')
+    if interval not in GOAL_HISTORY_INTERVALS:
+        return jsonify({'error': 'Invalid interval'}), 400
+
+    today = date.today()
+    try:
+        history = build_goal_history(goal, interval, today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify({
+        'goal_type': goal.goal_type,
+        'target': goal.target,
+        'interval': interval,
+        'history': history
+    })
+    response.set_etag(f'{goal.id}-{goal.version}-{interval}-{today.isoformat()}')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -1,19 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, send_file, current_app, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, send_file, current_app, Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, User, Book, Author, List, UserBook, Post, Translation
-from sqlalchemy import or_, func, and_, case, desc
-from sqlalchemy.orm import aliased
+from models import db, User, Book, Author, List, UserBook, Post, Translation, UserAuthorProgress, ImportJob, Activity
+from sqlalchemy import or_, func, and_, case, desc, select
+from sqlalchemy.orm import aliased, joinedload, selectinload
 from datetime import datetime, timedelta
 from io import BytesIO, StringIO
-from flask_babel import _, get_locale
+from flask_babel import _
+from request_context import current_language
 import csv
 import io
 import json
-from fuzzywuzzy import fuzz
+import os
+from import_jobs import submit_import_job, report_path
+from image_store import store_image, ensure_variants, variant_path, guess_mimetype, InvalidImage, \
+    IMAGE_CACHE_MAX_AGE, IMAGE_VARIANTS, VARIANT_FORMATS
+from search import search_ids, search_book_ids, AUTHOR_NAME, BOOK_TITLE
+from keyset import paginate
+from count_cache import estimate_search_totals
+from activity_log import user_activity_query, FEED_ORDER
+from timeline import timeline_query, follow, unfollow, is_following
 
 bp = Blueprint('home', __name__)
 
+PROFILE_FEED_PER_PAGE = 15
+TIMELINE_PER_PAGE = 20
+
 @bp.route('/')
 def index():
     book_search_query = request.args.get('book_search', '')
@@ -23,27 +35,30 @@ def index():
     per_page = 10
 
     if current_user.is_authenticated:
-        latest_books = Book.query.join(UserBook).filter(UserBook.user_id == current_user.id).order_by(UserBook.read_date.desc()).limit(5).all()
-
+        # Titles and author names are loaded with the books instead of one query per card
+        latest_books = Book.query.join(UserBook)\
+            .options(joinedload(Book.title), joinedload(Book.author).joinedload(Author.name))\
+            .filter(UserBook.user_id == current_user.id)\
+            .order_by(UserBook.read_date.desc())\
+            .limit(5).all()
+
+        # Top authors come from the user's own rows in the maintained progress table,
+        # so the cost follows the user's reading history rather than the catalog
         user_authors = db.session.query(
             Author,
-            func.count(Book.id).label('total_books'),
-            func.sum(case((UserBook.read_date.isnot(None), 1), else_=0)).label('read_books'),
-            func.count(case((Book.is_main_work == True, 1))).label('total_main_works'),
-            func.sum(case((and_(UserBook.read_date.isnot(None), Book.is_main_work == True), 1), else_=0)).label('read_main_works')
-        ).join(Book, Author.id == Book.author_id)\
-         .outerjoin(UserBook, (UserBook.book_id == Book.id) & (UserBook.user_id == current_user.id))\
-         .group_by(Author.id)\
-         .order_by(func.sum(case((UserBook.read_date.isnot(None), 1), else_=0)).desc())\
+            UserAuthorProgress.total_books,
+            UserAuthorProgress.read_books,
+            UserAuthorProgress.total_main_works,
+            UserAuthorProgress.read_main_works
+        ).join(UserAuthorProgress, UserAuthorProgress.author_id == Author.id)\
+         .options(joinedload(Author.name))\
+         .filter(UserAuthorProgress.user_id == current_user.id,
+                 UserAuthorProgress.read_books > 0,
+                 UserAuthorProgress.total_books > 0)\
+         .order_by(UserAuthorProgress.read_books.desc())\
          .limit(8)\
          .all()
 
-        user_authors = [
-            (author, total_books, read_books, total_main_works, read_main_works)
-            for author, total_books, read_books, total_main_works, read_main_works in user_authors
-            if total_books > 0 and read_books > 0
-        ]
-
         for author, total_books, read_books, total_main_works, read_main_works in user_authors:
             author.read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
             author.main_works_read_percentage = (read_main_works / total_main_works * 100) if total_main_works > 0 else 0
@@ -53,31 +68,17 @@ def index():
 
     books = None
     if book_search_query:
-        title_translation = aliased(Translation)
-        author_name_translation = aliased(Translation)
-
-        books = Book.query.join(title_translation, Book.title_id == title_translation.id)\
-            .join(Author, Book.author_id == Author.id)\
-            .join(author_name_translation, Author.name_id == author_name_translation.id)\
-            .filter(
-                or_(
-                    title_translation.text_en.ilike(f'%{book_search_query}%'),
-                    title_translation.text_de.ilike(f'%{book_search_query}%'),
-                    author_name_translation.text_en.ilike(f'%{book_search_query}%'),
-                    author_name_translation.text_de.ilike(f'%{book_search_query}%')
-                )
-            ).paginate(page=book_page, per_page=per_page, error_out=False)
+        matches = search_book_ids(book_search_query)
+        books = paginate(Book.query.join(matches, Book.id == matches.c.id),
+                         [matches.c.rank, Book.id], per_page, page=book_page, keyset=False,
+                         estimate=estimate_search_totals(book_search_query))
 
     authors = None
     if author_search_query:
-        author_name_translation = aliased(Translation)
-        authors = Author.query.join(author_name_translation, Author.name_id == author_name_translation.id)\
-            .filter(
-                or_(
-                    author_name_translation.text_en.ilike(f'%{author_search_query}%'),
-                    author_name_translation.text_de.ilike(f'%{author_search_query}%')
-                )
-            ).paginate(page=author_page, per_page=per_page, error_out=False)
+        matches = search_ids(AUTHOR_NAME, author_search_query)
+        authors = paginate(Author.query.join(matches, Author.id == matches.c.id),
+                           [matches.c.rank, Author.id], per_page, page=author_page, keyset=False,
+                           estimate=estimate_search_totals(author_search_query))
 
     return render_template('index.html',
                            latest_books=latest_books,
@@ -139,44 +140,75 @@ def logout():
 def user_profile(username):
     user = User.query.filter_by(username=username).first_or_404()
 
-    recent_activities = []
+    activities = paginate(user_activity_query(user.id, current_user.id), FEED_ORDER, PROFILE_FEED_PER_PAGE, keyset=True)
 
-    recent_books = UserBook.query.filter_by(user_id=user.id).filter(UserBook.read_date.isnot(None)).order_by(UserBook.read_date.desc()).limit(5).all()
-    for user_book in recent_books:
-        recent_activities.append({
-            'type': 'book_read',
-            'book': user_book.book,
-            'timestamp': datetime.combine(user_book.read_date, datetime.min.time())
-        })
+    import_jobs = []
+    if current_user.is_authenticated and current_user.id == user.id:
+        import_jobs = ImportJob.query.filter_by(user_id=user.id).order_by(ImportJob.id.desc()).limit(3).all()
 
-    recent_lists = List.query.filter_by(user_id=user.id).order_by(List.id.desc()).limit(5).all()
-    for list_item in recent_lists:
-        recent_activities.append({
-            'type': 'list_created',
-            'list': list_item,
-            'timestamp': datetime.fromtimestamp(list_item.id)
-        })
+    following = current_user.is_authenticated and current_user.id != user.id \
+        and is_following(current_user.id, user.id)
 
-    recent_posts = Post.query.filter_by(user_id=user.id).order_by(Post.timestamp.desc()).limit(5).all()
-    for post in recent_posts:
-        recent_activities.append({
-            'type': 'post_created',
-            'post': post,
-            'timestamp': post.timestamp
-        })
+    return render_template('profile.html', user=user, activities=activities, import_jobs=import_jobs,
+                           following=following)
 
-    recent_activities.sort(key=lambda x: x['timestamp'], reverse=True)
+@bp.route('/follow/<username>', methods=['POST'])
+@login_required
+def follow_user(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    if follow(current_user, user):
+        flash(_('You are now following %(username)s.', username=user.username))
+    return redirect(url_for('home.user_profile', username=user.username))
 
-    for activity in recent_activities:
-        activity['timestamp'] = activity['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+@bp.route('/unfollow/<username>', methods=['POST'])
+@login_required
+def unfollow_user(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    if unfollow(current_user, user):
+        flash(_('You are no longer following %(username)s.', username=user.username))
+    return redirect(url_for('home.user_profile', username=user.username))
 
-    return render_template('profile.html', user=user, recent_activities=recent_activities[:15])
+@bp.route('/timeline')
+@login_required
+def timeline():
+    query, order_by = timeline_query(current_user.id)
+    activities = paginate(query.options(joinedload(Activity.user)), order_by, TIMELINE_PER_PAGE, keyset=True)
+    return render_template('timeline.html', activities=activities)
+
+def _send_image_variant(image_hash, variant, **kwargs):
+    # Browsers that list WebP in Accept get it, everyone else the JPEG
+    extension = 'webp' if 'image/webp' in request.accept_mimetypes.values() else 'jpg'
+    response = send_file(variant_path(image_hash, variant, extension), mimetype=VARIANT_FORMATS[extension][1],
+                         etag=f'{image_hash}-{variant}.{extension}', conditional=True, **kwargs)
+    response.vary.add('Accept')
+    return response
+
+@bp.route('/images/<image_hash>', defaults={'variant': 'full'})
+@bp.route('/images/<image_hash>/<variant>')
+def image(image_hash, variant):
+    if variant not in IMAGE_VARIANTS or not ensure_variants(image_hash):
+        return "Image not found", 404
+    # The URL names the content, so it never has to be revalidated
+    response = _send_image_variant(image_hash, variant, max_age=IMAGE_CACHE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @bp.route('/profile_image/<int:user_id>')
 def profile_image(user_id):
-    user = User.query.get_or_404(user_id)
+    image_hash = db.session.query(User.profile_image_hash).filter(User.id == user_id).first_or_404()[0]
+    variant = request.args.get('variant', 'full')
+    if variant not in IMAGE_VARIANTS:
+        variant = 'full'
+    if ensure_variants(image_hash):
+        # Stable URL whose image can change, so clients revalidate against the hash
+        response = _send_image_variant(image_hash, variant, max_age=0)
+        response.cache_control.no_cache = True
+        return response
+
+    user = db.session.get(User, user_id)
     if user.profile_image:
-        return send_file(BytesIO(user.profile_image), mimetype='image/jpeg')
+        return send_file(BytesIO(user.profile_image), mimetype=guess_mimetype(user.profile_image))
     else:
         return send_file('static/images/default-profile.png', mimetype='image/png')
 
@@ -191,7 +223,13 @@ def edit_profile():
 
         profile_image = request.files.get('profile_image')
         if profile_image:
-            current_user.profile_image = profile_image.read()
+            try:
+                current_user.profile_image_hash = store_image(profile_image.read())
+                current_user.profile_image = None
+            except InvalidImage:
+                db.session.rollback()
+                flash(_('The profile image could not be read, please upload a JPEG, PNG, GIF or WebP file.'))
+                return redirect(url_for('home.edit_profile'))
 
         db.session.commit()
         flash(_('Your profile has been updated.'))
@@ -226,128 +264,73 @@ def import_csv():
         print("Error decoding JSON mappings")
         return jsonify({"error": "Invalid mapping data"}), 400
 
-    csv_content = csv_file.read().decode('utf-8')
-    csv_file = StringIO(csv_content)
-    csv_reader = csv.DictReader(csv_file, delimiter=';')
-
-    authors = Author.query.join(Translation, Author.name_id == Translation.id).all()
-    books = Book.query.join(Translation, Book.title_id == Translation.id)
-    imported_books = 0
-    for row in csv_reader:
-        title = row[mappings['title']]
-        author_name = row[mappings['author']]
-        read_date_str = row[mappings['read_date']]
-        rating = row.get(mappings.get('rating', ''), None)
-        review = row.get(mappings.get('review', ''), None)
-
-        if not title or not author_name:
-            continue
-
-        author_name = author_name.split(',;[(')[0].strip()
-        title = title.split(';[(')[0].strip()
-
-        author = Author.query.filter(or_(
-            Translation.text_en == author_name,
-            Translation.text_de == author_name,
-            Translation.text_en.ilike(f"%{author_name}%"),
-            Translation.text_de.ilike(f"%{author_name}%")
-        )).join(Author.name).first()
-
-        if not author:
-            highest_ratio = 0
-            for a in authors:
-                ratio_en = fuzz.partial_ratio(a.name.text_en, author_name)
-                ratio_de = fuzz.partial_ratio(a.name.text_de, author_name)
-
-                if max(ratio_en, ratio_de) > highest_ratio:
-                    highest_ratio = max(ratio_en, ratio_de)
-                    author = a
-
-            if not author or highest_ratio < 80:
-                print(f"Author not found: {author_name}")
-                continue
-            else:
-                print(f"Author found with fuzzy matching: {author_name} -> {author.name.text_en}")
-
-        book = Book.query.filter(
-            Book.author_id == author.id
-        ).filter(or_(
-            Translation.text_en == title,
-            Translation.text_de == title,
-            Translation.text_en.ilike(f"%{title}%"),
-            Translation.text_de.ilike(f"%{title}%")
-        )).join(Book.title).first()
-
-        if not book:
-            highest_ratio = 0
-            for b in books.filter(Book.author_id == author.id):
-                ratio_en = fuzz.partial_ratio(b.title.text_en, title)
-                ratio_de = fuzz.partial_ratio(b.title.text_de, title)
-
-                if max(ratio_en, ratio_de) > highest_ratio:
-                    highest_ratio = max(ratio_en, ratio_de)
-                    book = b
-
-            if not book or highest_ratio < 80:
-                print(f"Book not found: {title} by {author_name}")
-                continue
-            else:
-                print(f"Book found with fuzzy matching: {title} by {author_name} -> {book.title.text_en}")
-
-        user_book = UserBook.query.filter_by(user_id=current_user.id, book_id=book.id).first()
-        if not user_book:
-            user_book = UserBook(user_id=current_user.id, book_id=book.id)
-            db.session.add(user_book)
-
-        if read_date_str:
-            try:
-                read_date = datetime.strptime(read_date_str, '%Y-%m-%d' if get_locale() == 'en' else '%d.%m.%Y')
-                user_book.read_date = read_date
-            except ValueError:
-                print(f"Invalid date format for book: {title}")
+    # The worker resolves and imports the rows, the request only queues the job
+    job = submit_import_job(current_user.id, csv_file, mappings, current_language())
 
-        if rating:
-            try:
-                user_book.rating = float(rating)
-            except ValueError:
-                print(f"Invalid rating value for book: {title}")
+    flash(_("CSV import started. You can follow its progress on your profile."))
+    return redirect(url_for('home.user_profile', username=current_user.username, import_job=job.id))
 
-        if review:
-            user_book.review = review
-
-        imported_books += 1
-
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        flash(_("Database error occurred during import."))
+@bp.route('/import_jobs/<int:job_id>')
+@login_required
+def import_job_status(job_id):
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    status = job.to_dict()
+    if job.unmatched_rows:
+        status['report_url'] = url_for('home.import_job_report', job_id=job.id)
+    return jsonify(status)
+
+@bp.route('/import_jobs/<int:job_id>/report')
+@login_required
+def import_job_report(job_id):
+    job = ImportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    path = report_path(job)
+    if not os.path.exists(path):
+        return jsonify({"error": "No report available"}), 404
+    return send_file(os.path.abspath(path), mimetype='text/csv', as_attachment=True,
+                     download_name=f'import_{job.id}_unmatched.csv')
 
-    flash(_("CSV import processed successfully.") + " " + str(imported_books) + " " + _('books') + " " + _('imported'))
-    return redirect(url_for('home.user_profile', username=current_user.username))
+EXPORT_CHUNK_ROWS = 500
 
 @bp.route('/export_csv')
 @login_required
 def export_csv():
-    user_books = UserBook.query.filter_by(user_id=current_user.id).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow(['Title', 'Author', 'Read Date', 'Rating', 'Review'])
+    title = aliased(Translation)
+    author_name = aliased(Translation)
+    rows = db.session.query(
+        title.text_en,
+        author_name.text_en,
+        UserBook.read_date,
+        UserBook.rating,
+        UserBook.review
+    ).join(Book, Book.id == UserBook.book_id)\
+     .join(title, Book.title_id == title.id)\
+     .join(Author, Book.author_id == Author.id)\
+     .join(author_name, Author.name_id == author_name.id)\
+     .filter(UserBook.user_id == current_user.id)\
+     .order_by(UserBook.book_id)\
+     .yield_per(EXPORT_CHUNK_ROWS)
+
+    def generate():
+        # Rows are streamed from the cursor and sent in chunks, so memory stays flat for large libraries
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['Title', 'Author', 'Read Date', 'Rating', 'Review'])
+        for count, (book_title, book_author, read_date, rating, review) in enumerate(rows, start=1):
+            writer.writerow([
+                book_title,
+                book_author,
+                read_date.strftime('%Y-%m-%d') if read_date else '',
+                rating if rating is not None else '',
+                review if review else ''
+            ])
+            if count % EXPORT_CHUNK_ROWS == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
 
-    for user_book in user_books:
-        writer.writerow([
-            user_book.book.title.text_en,
-            user_book.book.author.name.text_en,
-            user_book.read_date.strftime('%Y-%m-%d') if user_book.read_date else '',
-            user_book.rating if user_book.rating is not None else '',
-            user_book.review if user_book.review else ''
-        ])
-
-    output.seek(0)
     return Response(
-        output,
+        stream_with_context(generate()),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment;filename=books_export.csv"}
     )
@@ -355,7 +338,6 @@ def export_csv():
 @bp.route('/my_read_books')
 @login_required
 def my_read_books():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     sort_by = request.args.get('sort', 'read_date')
     sort_order = request.args.get('order', 'desc')
@@ -365,29 +347,36 @@ def my_read_books():
     query = UserBook.query.filter_by(user_id=current_user.id).filter(UserBook.read_date.isnot(None))
     
     if filter_author:
-        query = query.join(Book).join(Author).join(Translation, Author.name_id == Translation.id).filter(
-            or_(Translation.text_en.ilike(f'%{filter_author}%'),
-                Translation.text_de.ilike(f'%{filter_author}%'))
-        )
+        author_matches = search_ids(AUTHOR_NAME, filter_author)
+        query = query.filter(UserBook.book_id.in_(
+            select(Book.id).where(Book.author_id.in_(select(author_matches.c.id)))))
     
     if filter_title:
-        query = query.join(Book).join(Translation, Book.title_id == Translation.id).filter(
-            or_(Translation.text_en.ilike(f'%{filter_title}%'),
-                Translation.text_de.ilike(f'%{filter_title}%'))
-        )
+        title_matches = search_ids(BOOK_TITLE, filter_title)
+        query = query.filter(UserBook.book_id.in_(select(title_matches.c.id)))
     
+    # Title and author sorts order the coalesced text, which no index covers: the seek
+    # sorts the user's read books found through ix_user_books_user_id_read_date
     if sort_by == 'title':
-        query = query.join(Book).join(Translation, Book.title_id == Translation.id).order_by(
-            desc(Translation.text_en) if sort_order == 'desc' else Translation.text_en
-        )
+        query = query.join(Book, Book.id == UserBook.book_id).join(Translation, Book.title_id == Translation.id)
+        sort_column = func.coalesce(Translation.text_en, '')
     elif sort_by == 'author':
-        query = query.join(Book).join(Author).join(Translation, Author.name_id == Translation.id).order_by(
-            desc(Translation.text_en) if sort_order == 'desc' else Translation.text_en
-        )
+        query = query.join(Book, Book.id == UserBook.book_id).join(Author, Author.id == Book.author_id)\
+            .join(Translation, Author.name_id == Translation.id)
+        sort_column = func.coalesce(Translation.text_en, '')
     else:  # Default: sort by read_date
-        query = query.order_by(desc(UserBook.read_date) if sort_order == 'desc' else UserBook.read_date)
+        sort_column = UserBook.read_date
+    # The book id makes the sort key unique for cursor pagination
+    if sort_order == 'desc':
+        order_by = [desc(sort_column), desc(UserBook.book_id)]
+    else:
+        order_by = [sort_column, UserBook.book_id]
     
-    paginated_books = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Titles and author names for the whole page in a few queries instead of three per book
+    query = query.options(selectinload(UserBook.book).selectinload(Book.title),
+                          selectinload(UserBook.book).selectinload(Book.author).selectinload(Author.name))
+    paginated_books = paginate(query, order_by, per_page, cache_count=False,
+                               estimate=estimate_search_totals(filter_author or filter_title))
     
     return render_template('my_read_books.html', 
                            books=paginated_books, 
@@ -1,17 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from models import Author, db, List, Book, UserBook, BookList, Translation
-from sqlalchemy.orm import joinedload
-from sqlalchemy import or_, func, and_
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import or_, func, and_, select
 from datetime import date
-from flask_babel import _, get_locale
+from flask_babel import _
+from request_context import current_language
+from progress import get_list_progress_stats
+from search import search_ids, search_book_ids, BOOK_TITLE, LIST_NAME
+from utils import find_row_position, get_read_book_ids
+from list_ranks import next_rank, rank_ordinals, reorder_books
+from keyset import paginate
+from count_cache import count_rows, estimate_rows, estimate_search_totals
+from list_cache import CACHEABLE_SORTS, list_page_key, get_cached_page, store_page
 
 bp = Blueprint('list', __name__)
 
 @bp.route('/lists')
 @login_required
 def lists():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     search_query = request.args.get('search', '')
 
@@ -20,18 +27,18 @@ def lists():
     )
 
     if search_query:
-        query = query.filter(or_(
-            Translation.text_en.ilike(f'%{search_query}%'),
-            Translation.text_de.ilike(f'%{search_query}%')
-        ))
+        matches = search_ids(LIST_NAME, search_query)
+        query = query.filter(List.id.in_(select(matches.c.id)))
 
-    lists = query.order_by(Translation.text_en).paginate(page=page, per_page=per_page, error_out=False)
+    # The user's own private lists are part of the count, so it is not cached
+    lists = paginate(query, [func.coalesce(Translation.text_en, ''), List.id], per_page, cache_count=False,
+                     estimate=estimate_search_totals(search_query))
 
     for list_item in lists.items:
         list_item.preview_books = list_item.books[:5]
         list_item.book_count = len(list_item.books)
 
-    lang = str(get_locale())
+    lang = current_language()
     return render_template('list/list.html',
                            lists=lists,
                            search_query=search_query,
@@ -47,85 +54,117 @@ def list_detail(id):
         return redirect(url_for('list.lists'))
 
     sort_by = request.args.get('sort', 'rank')
-    page = request.args.get('page', 1, type=int)
     per_page = 100
     search_query = request.args.get('search', '')
     direct_search = request.args.get('direct_search', '')
     book_id = request.args.get('book_id')
-
-    books_query = db.session.query(Book, BookList.rank, UserBook.read_date)\
+    jump_to_page = None
+    stats = get_list_progress_stats(current_user.id, id)
+
+    # Public pages without a search are shared by all users, only read flags differ
+    cache_key = None
+    if book_list.is_public and sort_by in CACHEABLE_SORTS and not (search_query or direct_search or book_id):
+        cache_key = list_page_key(book_list, sort_by, request.args.get('page', type=int),
+                                  request.args.get('cursor'), current_language())
+        cached = get_cached_page(cache_key)
+        if cached:
+            page_books, paginated_books = cached
+            return _render_list_detail(book_list, page_books, paginated_books, stats, sort_by,
+                                       search_query, stats['total_books'], False, book_id)
+
+    ordinals = rank_ordinals(id)
+    # The user's read dates are only joined for sorting, flags come from get_read_book_ids
+    books_query = db.session.query(Book, ordinals.c.ordinal)\
         .join(BookList, Book.id == BookList.book_id)\
+        .join(ordinals, ordinals.c.book_id == Book.id)\
         .outerjoin(UserBook, and_(UserBook.book_id == Book.id, UserBook.user_id == current_user.id))\
-        .filter(BookList.list_id == id)
+        .filter(BookList.list_id == id)\
+        .options(selectinload(Book.title), selectinload(Book.author).selectinload(Author.name))
 
     if search_query:
-        books_query = books_query.join(Translation, Book.title_id == Translation.id)\
-            .filter(or_(
-                Translation.text_en.ilike(f'%{search_query}%'),
-                Translation.text_de.ilike(f'%{search_query}%'),
-                Book.author.has(Translation.text_en.ilike(f'%{search_query}%')),
-                Book.author.has(Translation.text_de.ilike(f'%{search_query}%'))
-            ))
-
-    if direct_search:
-        books_query = books_query.join(Translation, Book.title_id == Translation.id)\
-            .filter(or_(
-                Translation.text_en.ilike(f'%{direct_search}%'),
-                Translation.text_de.ilike(f'%{direct_search}%')
-            ))
-        book = books_query.first()
-        if book:
-            page = (books_query.all().index(book) // per_page) + 1
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({'book_found': True, 'book_id': book[0].id})
-
-    if book_id:
-        book = books_query.filter(Book.id == book_id).first()
-        if book:
-            page = (books_query.all().index(book) // per_page) + 1
-
-    if sort_by == 'rank':
-        books_query = books_query.order_by(BookList.rank)
-    elif sort_by == 'title':
-        books_query = books_query.join(Translation, Book.title_id == Translation.id).order_by(Translation.text_en if get_locale() == 'en' else Translation.text_de)
+        matches = search_book_ids(search_query)
+        books_query = books_query.filter(Book.id.in_(select(matches.c.id)))
+
+    # Sort keys are never NULL and end with the book id, so page slices, cursors
+    # and position lookups all agree on one order
+    if sort_by == 'title':
+        books_query = books_query.join(Translation, Book.title_id == Translation.id)
+        order_by = [func.coalesce(Translation.text_en if current_language() == 'en' else Translation.text_de, '')]
     elif sort_by == 'author':
-        books_query = books_query.join(Book.author).join(Translation, Author.name_id == Translation.id).order_by(Translation.text_en if get_locale() == 'en' else Translation.text_de)
+        books_query = books_query.join(Book.author).join(Translation, Author.name_id == Translation.id)
+        order_by = [func.coalesce(Translation.text_en if current_language() == 'en' else Translation.text_de, '')]
     elif sort_by == 'read_status':
-        books_query = books_query.order_by(UserBook.read_date.desc().nullslast())
-
-    total_books = books_query.count()
-    paginated_books = books_query.paginate(page=page, per_page=per_page, error_out=False)
-
-    books = []
-    read_books = 0
-    total_main_works = 0
-    main_works_read = 0
-    for book, rank, read_date in paginated_books.items:
-        is_read = read_date is not None
-        if is_read:
-            read_books += 1
-        if book.is_main_work:
-            total_main_works += 1
-            if is_read:
-                main_works_read += 1
-        books.append({
+        order_by = [func.coalesce(UserBook.read_date, date.min).desc()]
+    elif sort_by == 'rating':
+        order_by = [func.coalesce(Book.average_rating, -1).desc(), BookList.rank]
+    else:
+        order_by = [BookList.rank]
+    order_by.append(Book.id)
+
+    if direct_search or book_id:
+        # The page holding the book under the current sort, from a single ROW_NUMBER() query
+        if direct_search:
+            candidate_ids = select(search_ids(BOOK_TITLE, direct_search).c.id)
+        else:
+            candidate_ids = [int(book_id)] if book_id.isdigit() else []
+        found_id, position = find_row_position(books_query, Book.id, order_by, candidate_ids)
+        if found_id is not None:
+            jump_to_page = (position - 1) // per_page + 1
+        if direct_search and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            if found_id is None:
+                return jsonify({'book_found': False})
+            return jsonify({'book_found': True, 'book_id': found_id, 'page': jump_to_page})
+
+    # Counted once and shared with the paginator: the whole list is already in the
+    # progress row, search results come from the count cache or an estimate
+    total_is_estimate = False
+    if not search_query:
+        total_books = stats['total_books']
+    elif estimate_search_totals(search_query):
+        total_books, exact = estimate_rows(books_query, jump_to_page or request.args.get('page', 1, type=int), per_page)
+        total_is_estimate = not exact
+    else:
+        total_books = count_rows(books_query, version=(book_list.id, book_list.version))
+
+    # A located book needs its page number, otherwise the list pages by cursor
+    paginated_books = paginate(books_query, order_by, per_page, page=jump_to_page, total=total_books)
+    paginated_books.total_is_estimate = total_is_estimate
+
+    page_books = []
+    for book, rank in paginated_books.items:
+        page_books.append({
             'id': book.id,
-            'title': book.title,
-            'author': book.author.name,
+            'title': str(book.title),
+            'author': str(book.author.name),
             'author_id': book.author_id,
             'cover_image_url': book.cover_image_url,
-            'is_read': is_read,
             'rank': "" if rank == 0 else str(rank) +("th" if 4<=rank%100<=20 else {1:"st",2:"nd",3:"rd"}.get(rank%10, "th")),
-            'is_main_work': book.is_main_work
+            'is_main_work': book.is_main_work,
+            'average_rating': book.average_rating
         })
+    if cache_key:
+        store_page(cache_key, page_books, paginated_books)
 
-    read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
-    main_works_read_percentage = (main_works_read / total_main_works * 100) if total_main_works > 0 else 0
+    return _render_list_detail(book_list, page_books, paginated_books, stats, sort_by,
+                               search_query, total_books, total_is_estimate, book_id)
+
+def _render_list_detail(book_list, page_books, paginated_books, stats, sort_by, search_query,
+                        total_books, total_is_estimate, book_id):
+    # Read flags are per user and overlaid on the (possibly cached) page
+    read_ids = get_read_book_ids(current_user.id, [book['id'] for book in page_books])
+    books = [dict(book, is_read=book['id'] in read_ids) for book in page_books]
+
+    read_books = stats['read_books']
+    read_percentage = stats['read_percentage']
+    total_main_works = stats['total_main_works']
+    main_works_read = stats['read_main_works']
+    main_works_read_percentage = stats['read_main_works_percentage']
 
     return render_template('list/detail.html',
                            list=book_list,
                            books=books,
                            pagination=paginated_books,
+                           read_books=read_books,
                            read_percentage=read_percentage,
                            sort_by=sort_by,
                            total_main_works=total_main_works,
@@ -133,6 +172,7 @@ def list_detail(id):
                            main_works_read_percentage=main_works_read_percentage,
                            search_query=search_query,
                            total_books=total_books,
+                           total_is_estimate=total_is_estimate,
                            book_id=book_id)
 
 @bp.route('/toggle_read_status', methods=['POST'])
@@ -156,25 +196,17 @@ def toggle_read_status():
 
     db.session.commit()
 
-    book_list = List.query.get(list_id)
-    total_books = len(book_list.books)
-    read_books = UserBook.query.filter(
-        UserBook.user_id == current_user.id,
-        UserBook.book_id.in_([book.id for book in book_list.books]),
-        UserBook.read_date.isnot(None)).count()
-    read_percentage = (read_books / total_books * 100) if total_books > 0 else 0
-
-    main_works = [book for book in book_list.books if book.is_main_work]
-    total_main_works = len(main_works)
-    main_works_read = UserBook.query.filter(
-        UserBook.user_id == current_user.id,
-        UserBook.book_id.in_([book.id for book in main_works]),
-        UserBook.read_date.isnot(None)).count()
-    main_works_read_percentage = (main_works_read / total_main_works * 100) if total_main_works > 0 else 0
+    # Counters are kept current by the progress table on flush
+    stats = get_list_progress_stats(current_user.id, list_id)
+    read_books = stats['read_books']
+    read_percentage = stats['read_percentage']
+    main_works_read = stats['read_main_works']
+    main_works_read_percentage = stats['read_main_works_percentage']
 
     return jsonify({
         'success': True,
         'is_read': is_read,
+        'read_books': read_books,
         'read_percentage': round(read_percentage, 0),
         'main_works_read': main_works_read,
         'main_works_read_percentage': round(main_works_read_percentage, 0)
@@ -227,12 +259,11 @@ def add_book_to_list():
             'error': 'Book already in list'
         }), 400
 
-    max_rank = db.session.query(func.max(
-        BookList.rank)).filter_by(list_id=list_id).scalar() or 0
     new_book_list = BookList(list_id=list_id,
                              book_id=book_id,
-                             rank=max_rank + 1)
+                             rank=next_rank(list_id))
     db.session.add(new_book_list)
+    book_list.version = List.version + 1
     db.session.commit()
 
     return jsonify({'success': True, 'message': 'Book added to list'})
@@ -259,13 +290,9 @@ def remove_book_from_list():
     if not book_list_entry:
         return jsonify({'success': False, 'error': 'Book not in list'}), 400
 
+    # Display ranks are derived, so the remaining rows keep their values
     db.session.delete(book_list_entry)
-    db.session.commit()
-
-    remaining_books = BookList.query.filter_by(list_id=list_id).order_by(
-        BookList.rank).all()
-    for i, book in enumerate(remaining_books, start=1):
-        book.rank = i
+    book_list.version = List.version + 1
     db.session.commit()
 
     return jsonify({'success': True, 'message': 'Book removed from list'})
@@ -288,11 +315,8 @@ def update_ranks():
         }), 404
 
     try:
-        for index, book_id in enumerate(book_ids, start=1):
-            book_list_entry = BookList.query.filter_by(
-                list_id=list_id, book_id=book_id).first()
-            if book_list_entry:
-                book_list_entry.rank = index
+        if reorder_books(list_id, book_ids):
+            book_list.version = List.version + 1
         db.session.commit()
         return jsonify({
             'success': True,
@@ -0,0 +1,69 @@
+import re
+from sqlalchemy import select, text, or_, func, literal, union_all, inspect, Integer, Float
+from models import db, Book, Author, List, Translation
+
+# Full-text search over translated names, backed by the SQLite FTS5 table
+# search_index. Every row is tagged with the entity that owns the translation;
+# triggers on translation/books/authors/lists keep it in sync (see the
+# add_search_index migration). Other databases, or a database that has not been
+# migrated yet, fall back to ILIKE over the translation table.
+
+BOOK_TITLE = 'book_title'
+AUTHOR_NAME = 'author_name'
+LIST_NAME = 'list_name'
+
+_ENTITY_COLUMNS = {
+    BOOK_TITLE: (Book.id, Book.title_id),
+    AUTHOR_NAME: (Author.id, Author.name_id),
+    LIST_NAME: (List.id, List.name_id),
+}
+
+_fts_available = {}
+
+
+def _use_fts():
+    engine = db.engine
+    if engine.url not in _fts_available:
+        _fts_available[engine.url] = engine.dialect.name == 'sqlite' and \
+            inspect(engine).has_table('search_index')
+    return _fts_available[engine.url]
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 query where every word is a quoted prefix term."""
+    terms = re.findall(r'\w+', query or '', re.UNICODE)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_ids(entity, query):
+    """Return a subquery of ``(id, rank)`` for entities whose name matches ``query``.
+
+    Lower ranks are better matches, so callers order by ``rank`` ascending for
+    relevance or just filter with ``Model.id.in_(select(matches.c.id))``.
+    """
+    match_query = build_match_query(query)
+    if match_query and _use_fts():
+        return text(
+            "SELECT entity_id AS id, bm25(search_index) AS rank FROM search_index "
+            "WHERE search_index MATCH :match_query AND entity = :entity"
+        ).bindparams(match_query=match_query, entity=entity)\
+         .columns(id=Integer, rank=Float)\
+         .subquery()
+
+    id_column, translation_id = _ENTITY_COLUMNS[entity]
+    return select(id_column.label('id'), literal(0.0).label('rank'))\
+        .join(Translation, Translation.id == translation_id)\
+        .where(or_(Translation.text_en.ilike(f'%{query}%'),
+                   Translation.text_de.ilike(f'%{query}%')))\
+        .subquery()
+
+
+def search_book_ids(query):
+    """Return a subquery of ``(id, rank)`` for books matching ``query`` by title or author name."""
+    title_matches = search_ids(BOOK_TITLE, query)
+    author_matches = search_ids(AUTHOR_NAME, query)
+    hits = union_all(
+        select(title_matches.c.id, title_matches.c.rank),
+        select(Book.id, author_matches.c.rank).join(author_matches, Book.author_id == author_matches.c.id)
+    ).subquery()
+    return select(hits.c.id, func.min(hits.c.rank).label('rank')).group_by(hits.c.id).subquery()
@@ -242,7 +242,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const currentUrl = new URL(window.location.href);
                 currentUrl.searchParams.set('direct_search', searchTerm);
                 
-                fetch(currentUrl.toString())
+                fetch(currentUrl.toString(), { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
                     .then(response => response.json())
                     .then(data => {
                         if (data.book_found) {
@@ -251,6 +251,13 @@ document.addEventListener('DOMContentLoaded', function() {
                                 bookElement.scrollIntoView({ behavior: 'smooth', block: 'center' });
                                 bookElement.classList.add('highlight');
                                 setTimeout(() => bookElement.classList.remove('highlight'), 2000);
+                            } else {
+                                // The book is on another page of the list
+                                const pageUrl = new URL(window.location.href);
+                                pageUrl.searchParams.delete('direct_search');
+                                pageUrl.searchParams.set('page', data.page);
+                                pageUrl.searchParams.set('book_id', data.book_id);
+                                window.location.href = pageUrl.toString();
                             }
                         }
                     });
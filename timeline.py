@@ -0,0 +1,147 @@
+from sqlalchemy import select, insert, update, delete, exists, func, literal, tuple_, union_all, or_
+from models import db, Activity, List, TimelineEntry, User, followers
+from activity_log import activity_query, on_new_activities
+
+# The timeline shows the activities of everyone a user follows. New activities
+# are fanned out on write: the flush that logs them also copies (follower,
+# activity) into timeline_entries, so reading a timeline is one range scan of
+# the reader's inbox on (user_id, occurred_at, activity_id).
+#
+# Accounts with more than FANOUT_FOLLOWER_LIMIT followers are not fanned out,
+# a single post would otherwise cost a write per follower. Their activities are
+# pulled from the activities index when a follower reads the timeline and merged
+# with the inbox. Inboxes keep the newest INBOX_LIMIT entries, older ones are
+# dropped by trim_inboxes (run by the worker). Lists that are not public are
+# never fanned out, and the feed query hides them from everyone but the owner.
+
+FANOUT_FOLLOWER_LIMIT = 1000
+INBOX_LIMIT = 500
+# Recent activities copied into the inbox when a user follows someone
+FOLLOW_BACKFILL = 50
+
+
+def _fans_out(follower_count):
+    return follower_count <= FANOUT_FOLLOWER_LIMIT
+
+
+def _shared_with_followers():
+    return or_(Activity.list_id.is_(None), Activity.list.has(List.is_public == True))
+
+
+@on_new_activities
+def _fan_out(connection, activities):
+    author_ids = {activity.user_id for activity in activities}
+    pushed = set(connection.scalars(
+        select(User.id).where(User.id.in_(author_ids),
+                              User.follower_count.between(1, FANOUT_FOLLOWER_LIMIT))))
+    activity_ids = [activity.id for activity in activities if activity.user_id in pushed]
+    if not activity_ids:
+        return
+    connection.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'activity_id', 'occurred_at'],
+        select(followers.c.follower_id, Activity.id, Activity.occurred_at)
+        .join(followers, followers.c.followed_id == Activity.user_id)
+        .where(Activity.id.in_(activity_ids), _shared_with_followers())))
+
+
+def _fill_inbox(follower_id, followed_id, limit=FOLLOW_BACKFILL):
+    already_there = exists().where(TimelineEntry.user_id == follower_id,
+                                   TimelineEntry.activity_id == Activity.id)
+    recent = select(literal(follower_id), Activity.id, Activity.occurred_at)\
+        .where(Activity.user_id == followed_id, _shared_with_followers(), ~already_there)\
+        .order_by(Activity.occurred_at.desc(), Activity.id.desc())\
+        .limit(limit)
+    db.session.execute(insert(TimelineEntry).from_select(['user_id', 'activity_id', 'occurred_at'], recent))
+
+
+def is_following(follower_id, followed_id):
+    return db.session.query(exists().where(followers.c.follower_id == follower_id,
+                                           followers.c.followed_id == followed_id)).scalar()
+
+
+def follow(follower, followed):
+    """Make ``follower`` follow ``followed``, False if that is themselves or already the case."""
+    if follower.id == followed.id or is_following(follower.id, followed.id):
+        return False
+    db.session.execute(insert(followers).values(follower_id=follower.id, followed_id=followed.id))
+    follower_count = db.session.execute(
+        update(User).where(User.id == followed.id)
+        .values(follower_count=User.follower_count + 1)
+        .returning(User.follower_count)).scalar_one()
+    if _fans_out(follower_count):
+        _fill_inbox(follower.id, followed.id)
+    db.session.commit()
+    return True
+
+
+def unfollow(follower, followed):
+    """Stop ``follower`` following ``followed``, False if they did not."""
+    removed = db.session.execute(
+        delete(followers).where(followers.c.follower_id == follower.id,
+                                followers.c.followed_id == followed.id)).rowcount
+    if not removed:
+        return False
+    follower_count = db.session.execute(
+        update(User).where(User.id == followed.id)
+        .values(follower_count=User.follower_count - 1)
+        .returning(User.follower_count)).scalar_one()
+    db.session.execute(
+        delete(TimelineEntry).where(TimelineEntry.user_id == follower.id,
+                                    TimelineEntry.activity_id.in_(
+                                        select(Activity.id).where(Activity.user_id == followed.id))))
+    if follower_count == FANOUT_FOLLOWER_LIMIT:
+        # Back to fan-out: what was pulled while above the limit has to be in the inboxes now
+        remaining = db.session.scalars(
+            select(followers.c.follower_id).where(followers.c.followed_id == followed.id)).all()
+        for follower_id in remaining:
+            _fill_inbox(follower_id, followed.id)
+    db.session.commit()
+    return True
+
+
+def timeline_query(user_id):
+    """Return ``(query, order_by)`` of the visible activities on ``user_id``'s timeline."""
+    pulled_ids = db.session.scalars(
+        select(followers.c.followed_id)
+        .join(User, User.id == followers.c.followed_id)
+        .where(followers.c.follower_id == user_id, User.follower_count > FANOUT_FOLLOWER_LIMIT)).all()
+    if not pulled_ids:
+        query = activity_query(user_id).join(TimelineEntry, TimelineEntry.activity_id == Activity.id)\
+            .filter(TimelineEntry.user_id == user_id)
+        return query, (TimelineEntry.occurred_at.desc(), TimelineEntry.activity_id.desc())
+
+    # Activities fanned out before an account passed the limit are already in the inbox
+    in_inbox = exists().where(TimelineEntry.user_id == user_id, TimelineEntry.activity_id == Activity.id)
+    entries = union_all(
+        select(TimelineEntry.activity_id.label('activity_id'), TimelineEntry.occurred_at.label('occurred_at'))
+        .where(TimelineEntry.user_id == user_id),
+        select(Activity.id, Activity.occurred_at)
+        .where(Activity.user_id.in_(pulled_ids), ~in_inbox),
+    ).subquery()
+    query = activity_query(user_id).join(entries, entries.c.activity_id == Activity.id)
+    return query, (entries.c.occurred_at.desc(), entries.c.activity_id.desc())
+
+
+def trim_inboxes(limit=INBOX_LIMIT):
+    """Drop all but the newest ``limit`` entries of every inbox, returns how many were removed."""
+    ranked = select(
+        TimelineEntry.user_id, TimelineEntry.activity_id,
+        func.row_number().over(partition_by=TimelineEntry.user_id,
+                               order_by=(TimelineEntry.occurred_at.desc(), TimelineEntry.activity_id.desc()))
+        .label('position'),
+    ).subquery()
+    overflow = select(ranked.c.user_id, ranked.c.activity_id).where(ranked.c.position > limit)
+    removed = db.session.execute(
+        delete(TimelineEntry).where(tuple_(TimelineEntry.user_id, TimelineEntry.activity_id).in_(overflow))).rowcount
+    db.session.commit()
+    return removed
+
+
+def backfill_timelines():
+    """Fill the inboxes of follows that predate the timeline."""
+    pairs = db.session.query(followers.c.follower_id, followers.c.followed_id)\
+        .join(User, User.id == followers.c.followed_id)\
+        .filter(User.follower_count <= FANOUT_FOLLOWER_LIMIT).all()
+    for follower_id, followed_id in pairs:
+        _fill_inbox(follower_id, followed_id)
+    db.session.commit()
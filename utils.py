@@ -1,5 +1,7 @@
 import time
+from sqlalchemy import func
 from models import db, Author, Book, UserBook, BookList, Translation
+from enrichment import enqueue_enrichment, book_needs_enrichment, author_needs_enrichment
 from flask import current_app
 import requests
 from typing import Dict, Any, Optional
@@ -7,51 +9,101 @@ import csv
 import io
 from datetime import datetime
 
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups
+READ_STATUS_CHUNK_SIZE = 500
+# Seconds to wait for Google Books and Wikipedia before giving up
+API_TIMEOUT = 10
+
+
+def get_read_book_ids(user_id, book_ids):
+    """Return the subset of ``book_ids`` the user has read, using one query per chunk."""
+    book_ids = list(set(book_ids))
+    read_ids = set()
+    for start in range(0, len(book_ids), READ_STATUS_CHUNK_SIZE):
+        chunk = book_ids[start:start + READ_STATUS_CHUNK_SIZE]
+        rows = db.session.query(UserBook.book_id).filter(
+            UserBook.user_id == user_id,
+            UserBook.book_id.in_(chunk),
+            UserBook.read_date.isnot(None)
+        )
+        read_ids.update(book_id for book_id, in rows)
+    return read_ids
+
+
+def resolve_read_status(books, user_id):
+    """Resolve read flags and reading statistics for a batch of books in a single pass.
+
+    ``books`` may be Book instances or rows exposing ``id`` and ``is_main_work``.
+    Returns a ``(stats, read_flags)`` tuple where ``read_flags`` maps book id to bool.
+    """
+    read_ids = get_read_book_ids(user_id, [book.id for book in books])
+
+    read_flags = {}
+    read_books = 0
+    total_main_works = 0
+    read_main_works = 0
+    for book in books:
+        is_read = book.id in read_ids
+        read_flags[book.id] = is_read
+        if is_read:
+            read_books += 1
+        if book.is_main_work:
+            total_main_works += 1
+            if is_read:
+                read_main_works += 1
+
+    total_books = len(books)
+    stats = {
+        'total_books': total_books,
+        'read_books': read_books,
+        'read_percentage': (read_books / total_books * 100) if total_books > 0 else 0,
+        'total_main_works': total_main_works,
+        'read_main_works': read_main_works,
+        'read_main_works_percentage': (read_main_works / total_main_works * 100) if total_main_works > 0 else 0
+    }
+    return stats, read_flags
+
+
+def find_row_position(query, id_column, order_by, candidate_ids):
+    """Return ``(id, position)`` of the first of ``candidate_ids`` in ``query`` under ``order_by``.
+
+    Positions are 1-based and computed with ROW_NUMBER() in the database, so only
+    one row comes back no matter how long the result is. ``candidate_ids`` may be
+    a list of ids or a select of ids. Returns ``(None, None)`` if none is found.
+    """
+    numbered = query.with_entities(
+        id_column.label('row_id'),
+        func.row_number().over(order_by=order_by).label('position')
+    ).order_by(None).subquery()
+    row = db.session.query(numbered.c.row_id, numbered.c.position)\
+        .filter(numbered.c.row_id.in_(candidate_ids))\
+        .order_by(numbered.c.position)\
+        .first()
+    return tuple(row) if row else (None, None)
+
 
 def calculate_read_percentage(books, user_id):
     if not books:
         return 0
-    read_books = sum(1 for book in books if is_book_read(book, user_id))
-    return (read_books / len(books)) * 100
+    return get_books_stats(books, user_id)['read_percentage']
 
 
 def calculate_read_main_works_percentage(books, user_id):
-    main_works = [book for book in books if book.is_main_work]
-    if not main_works:
-        return 0
-    return calculate_read_percentage(main_works, user_id)
+    return get_books_stats(books, user_id)['read_main_works_percentage']
 
 
 def get_books_stats(books, user_id):
-    read_books = sum(1 for book in books if is_book_read(book, user_id))
-    main_works = [book for book in books if book.is_main_work]
-    read_main_works = sum(1 for book in main_works
-                          if is_book_read(book, user_id))
-    return {
-        'total_books':
-        len(books),
-        'read_books':
-        read_books,
-        'read_percentage':
-        calculate_read_percentage(books, user_id),
-        'total_main_works':
-        len(main_works),
-        'read_main_works':
-        read_main_works,
-        'read_main_works_percentage':
-        calculate_read_main_works_percentage(books, user_id)
-    }
+    stats, _ = resolve_read_status(books, user_id)
+    return stats
 
 
 def is_book_read(book, user_id):
-    user_book = UserBook.query.filter_by(user_id=user_id,
-                                         book_id=book.id).first()
-    return user_book.is_read if user_book else False
-
-def map_author_data(author, user_id):  
-    books = [map_book_data(book, user_id) for book in author.books]
-    book_stats = get_books_stats(author.books, user_id)    
-    
+    return book.id in get_read_book_ids(user_id, [book.id])
+
+def map_author_data(author, user_id):
+    book_stats, read_flags = resolve_read_status(author.books, user_id)
+    books = [_book_data(book, read_flags[book.id]) for book in author.books]
+
     author_data = {
         'id': author.id,
         'name': author.name,
@@ -65,14 +117,15 @@ def map_author_data(author, user_id):
         'read_main_works_percentage': book_stats['read_main_works_percentage']
     }
 
-    if not author.image_url:
-        author.image_url = get_author_image_from_wikimedia(author.name)
-        db.session.commit()
+    # Missing data is fetched by the enrichment worker, never while rendering
+    enqueue_enrichment('book', [book.id for book in author.books if book_needs_enrichment(book)])
+    if author_needs_enrichment(author):
+        enqueue_enrichment('author', [author.id])
     return author_data
 
 def get_author_image_from_wikimedia(author_name):
     # Definiere die API-Endpunkt-URL
-    url = "https://en.wikipedia.org/w/api.php"
+    url = current_app.config['WIKIPEDIA_API_URL']
 
     # Parameter für die Wikipedia-API, um die Seite des Autors zu suchen
     params = {
@@ -84,7 +137,7 @@ def get_author_image_from_wikimedia(author_name):
     }
 
     # Anfrage an die Wikipedia-API senden
-    response = requests.get(url, params=params)
+    response = requests.get(url, params=params, timeout=API_TIMEOUT)
     response.raise_for_status()
     data = response.json()
 
@@ -96,13 +149,13 @@ def get_author_image_from_wikimedia(author_name):
 
     return None
 
-def map_book_data(book, user_id):
-    book_data = {
+def _book_data(book, is_read):
+    return {
         'id': book.id,
         'title': book.title,
         'author': book.author.name,
         'author_id': book.author_id,
-        'is_read': is_book_read(book, user_id),
+        'is_read': is_read,
         'is_main_work': book.is_main_work,
         'cover_image_url': book.cover_image_url
         or '/static/images/no-cover.png',
@@ -113,37 +166,23 @@ def map_book_data(book, user_id):
         'lists': []
     }
 
-    if not all([
-            book.isbn, book.description, book.cover_image_url, book.page_count,
-            book.published_date
-    ]):
-        google_books_info = fetch_google_books_info(book.title,
-                                                    book.author.name)
-
-        book_data['isbn'] = book.isbn or google_books_info.get('isbn')
-        book_data['description'] = book.description or google_books_info.get(
-            'description')
-        book_data[
-            'cover_image_url'] = book.cover_image_url or google_books_info.get(
-                'cover_image_url')
-        book_data['page_count'] = book.page_count or google_books_info.get(
-            'page_count')
-        book_data[
-            'published_date'] = book.published_date or google_books_info.get(
-                'published_date')
-
-        book.isbn = book_data['isbn']
-        book.description = book_data['description']
-        book.cover_image_url = book_data['cover_image_url']
-        book.page_count = book_data['page_count']
-        book.published_date = book_data['published_date']
-
-        db.session.commit()
+def map_book_data(book, user_id, is_read=None):
+    if is_read is None:
+        is_read = is_book_read(book, user_id)
+
+    book_data = _book_data(book, is_read)
+    if book_needs_enrichment(book):
+        enqueue_enrichment('book', [book.id])
     return book_data
 
 
-def fetch_google_books_info(title: str, author: str) -> Optional[Dict[str, Any]]:
-    base_url = "https://www.googleapis.com/books/v1/volumes"
+def fetch_google_books_info(title: str, author: str, raise_errors: bool = False) -> Optional[Dict[str, Any]]:
+    """Look up a book on Google Books, None if there is no match.
+
+    Failed requests also return None unless ``raise_errors`` is set, so callers
+    that retry (the enrichment worker) can tell them apart from a missing match.
+    """
+    base_url = current_app.config['GOOGLE_BOOKS_API_URL']
     params = {
         "q": f"intitle:{title}+inauthor:{author}",
         "langRestrict": "en",
@@ -151,7 +190,7 @@ def fetch_google_books_info(title: str, author: str) -> Optional[Dict[str, Any]]
     }
 
     try:
-        response = requests.get(base_url, params=params)
+        response = requests.get(base_url, params=params, timeout=API_TIMEOUT)
         response.raise_for_status()
         data = response.json()
 
@@ -167,7 +206,7 @@ def fetch_google_books_info(title: str, author: str) -> Optional[Dict[str, Any]]
 
             # Fetch German version
             params["langRestrict"] = "de"
-            response_de = requests.get(base_url, params=params)
+            response_de = requests.get(base_url, params=params, timeout=API_TIMEOUT)
             response_de.raise_for_status()
             data_de = response_de.json()
 
@@ -182,12 +221,14 @@ def fetch_google_books_info(title: str, author: str) -> Optional[Dict[str, Any]]
             return None
 
     except requests.RequestException as e:
+        if raise_errors:
+            raise
         print(f"Error fetching book info: {e}")
         return None
 
 
 def fetch_google_authors_info(author_name: str) -> Optional[Dict[str, Any]]:
-    base_url = "https://www.googleapis.com/books/v1/volumes"
+    base_url = current_app.config['GOOGLE_BOOKS_API_URL']
     params = {
         "q": f"inauthor:{author_name}",
         "langRestrict": "en",
@@ -195,7 +236,7 @@ def fetch_google_authors_info(author_name: str) -> Optional[Dict[str, Any]]:
     }
 
     try:
-        response = requests.get(base_url, params=params)
+        response = requests.get(base_url, params=params, timeout=API_TIMEOUT)
         response.raise_for_status()
         data = response.json()
 
@@ -209,7 +250,7 @@ def fetch_google_authors_info(author_name: str) -> Optional[Dict[str, Any]]:
 
             # Fetch German version
             params["langRestrict"] = "de"
-            response_de = requests.get(base_url, params=params)
+            response_de = requests.get(base_url, params=params, timeout=API_TIMEOUT)
             response_de.raise_for_status()
             data_de = response_de.json()
 